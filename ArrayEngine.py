@@ -0,0 +1,93 @@
+import numpy as np
+from typing import Dict, List, Tuple
+Matrix = List[List[float]]
+
+
+# Array version of the AuctionState scoring pipeline, same results as the list path.
+# bids are U x P, owners a length U int vector, synergies flat arrays of (player, u_i, u_j, value).
+# Only u_i < u_j entries are read, as in AuctionState.synergy_matrix
+class ArrayEngine:
+    def __init__(self, bids: Matrix, synergies: List[Dict[Tuple[int, int], float]], bid_sums: List[float]):
+        self.bids = np.array(bids, dtype=float)
+        self.num_units, self.num_players = self.bids.shape
+        entries = [(player, u_i, u_j, synergy) for player, player_synergies in enumerate(synergies)
+                   for (u_i, u_j), synergy in player_synergies.items() if u_i < u_j]
+        entries = np.array(entries, dtype=float).reshape((len(entries), 4))
+        self.synergy_players = entries[:, 0].astype(np.intp)
+        self.synergy_units_i = entries[:, 1].astype(np.intp)
+        self.synergy_units_j = entries[:, 2].astype(np.intp)
+        self.synergy_values = entries[:, 3]
+        self.bid_sums = np.array(bid_sums, dtype=float)
+        self.opp_ratio = 1-1/self.num_players
+
+    @classmethod
+    def from_state(cls, state) -> 'ArrayEngine':
+        bids = np.frombuffer(state.roster.bids).reshape((len(state.roster), len(state.players)))
+        return cls(bids, state.synergies, state.bid_sums)
+
+    # U x P, row u has a 1 in column owners[u]. Unassigned (-1) lands in the last team, as in teams()
+    def owner_matrix(self, owners: np.ndarray) -> np.ndarray:
+        owned = np.zeros((self.num_units, self.num_players))
+        owned[np.arange(self.num_units), owners] = 1
+        return owned
+
+    def value_matrix(self, owned: np.ndarray) -> np.ndarray:
+        return self.bids.T @ owned
+
+    # s[i][j] = sum over a < b both on team j of synergies[i][(a, b)]
+    def synergy_matrix(self, owners: np.ndarray) -> np.ndarray:
+        return self.synergy_matrices(np.asarray(owners)[np.newaxis])[0]
+
+    def v_s_matrix(self, owners: np.ndarray) -> np.ndarray:
+        return np.maximum(0.0, self.value_matrix(self.owner_matrix(owners)) + self.synergy_matrix(owners))
+
+    # pricing.apply_redundancy, with 0 where the denominator is 0
+    def final_matrix(self, owners: np.ndarray) -> np.ndarray:
+        return self.redundancy(self.v_s_matrix(owners))
+
+    # pricing.allocation_score
+    def score(self, owners: np.ndarray, robust_factor: float) -> float:
+        return float(self.scores(self.final_matrix(owners)[np.newaxis], robust_factor)[0])
+
+    # Batch versions take K x U owners, one candidate allocation per row, and return K x P x P matrices
+
+    def value_matrices(self, owners: np.ndarray) -> np.ndarray:
+        owned = (owners[:, :, np.newaxis] % self.num_players == np.arange(self.num_players)).astype(float)
+        return self.bids.T @ owned
+
+    def synergy_matrices(self, owners: np.ndarray) -> np.ndarray:
+        num_candidates = len(owners)
+        owners = owners % self.num_players
+        team_i = owners[:, self.synergy_units_i]
+        same_team = team_i == owners[:, self.synergy_units_j]
+        candidates, entries = np.nonzero(same_team)
+        cells = (candidates * self.num_players + self.synergy_players[entries]) * self.num_players + \
+            team_i[candidates, entries]
+        return np.bincount(cells, weights=self.synergy_values[entries],
+                           minlength=num_candidates * self.num_players**2).reshape(
+            (num_candidates, self.num_players, self.num_players))
+
+    # values are P x P or K x P x P, row i is redundancy adjusted with player i's bid sum
+    def redundancy(self, values: np.ndarray) -> np.ndarray:
+        max_v = self.bid_sums[:, np.newaxis]
+        denominator = values + max_v * self.opp_ratio
+        safe = np.where(denominator == 0, 1, denominator)
+        return np.where(denominator == 0, 0, values * max_v / safe)
+
+    def final_matrices(self, owners: np.ndarray) -> np.ndarray:
+        owners = np.asarray(owners, dtype=np.intp).reshape((-1, self.num_units))
+        return self.redundancy(np.maximum(0.0, self.value_matrices(owners) + self.synergy_matrices(owners)))
+
+    # pricing.comp_sat of every row of each final matrix, K x P
+    def comp_sats(self, finals: np.ndarray) -> np.ndarray:
+        own = np.diagonal(finals, axis1=1, axis2=2)
+        return own - (finals.sum(axis=2) - own) / (self.num_players - 1)
+
+    # pricing.allocation_score of each final matrix
+    def scores(self, finals: np.ndarray, robust_factor: float) -> np.ndarray:
+        return np.sum(self.comp_sats(finals) + np.diagonal(finals, axis1=1, axis2=2) * robust_factor, axis=1)
+
+    # pricing.pareto_prices of each final matrix, K x P
+    def handicaps(self, finals: np.ndarray) -> np.ndarray:
+        sats = self.comp_sats(finals)
+        return (sats - sats.min(axis=1, keepdims=True)) * self.opp_ratio
@@ -0,0 +1,98 @@
+import os
+import time
+
+# Levels, each includes the ones before it.
+# QUIET prints nothing to the terminal, files still get SUMMARY lines
+QUIET = 0
+SUMMARY = 1
+VERBOSE = 2
+
+
+# Streams log lines to the numbered output files as they are logged, instead of holding them until the file is named.
+# Lines go to output/NN_partial.txt through a buffered writer, renamed to output/NN_name.txt by write().
+# At VERBOSE, files have the same contents as joining every logged line with newlines.
+class AuctionLog:
+    def __init__(self, level: int = VERBOSE, progress_interval: float = 1.0, files: bool = True):
+        self.level = level
+        # False to only print, e.g. for auctions rebuilt in worker processes
+        self.files = files
+        # progress lines reach the terminal at most this often (seconds), files still get every one
+        self.progress_interval = progress_interval
+        self.last_progress = -progress_interval
+        self.directory = ''
+        self.logs_written = 0
+        self.file = None
+        self.lines_in_file = 0
+
+    def partial_filename(self) -> str:
+        return f'{self.directory}{self.logs_written:02d}_partial.txt'
+
+    def open(self):
+        os.makedirs(self.directory or '.', exist_ok=True)
+        self.file = open(self.partial_filename(), 'w', buffering=1 << 16)
+        self.lines_in_file = 0
+
+    def echo(self, text: str, level: int = SUMMARY):
+        if level <= self.level and self.level > QUIET:
+            print(text)
+
+    def log(self, text: str, level: int = SUMMARY, progress: bool = False):
+        if level > max(self.level, SUMMARY):
+            return
+        if level <= self.level and self.level > QUIET:
+            if progress:
+                now = time.perf_counter()
+                if now - self.last_progress >= self.progress_interval:
+                    self.last_progress = now
+                    print(text)
+            else:
+                print(text)
+
+        if not self.files:
+            return
+        if self.file is None:
+            self.open()
+        if self.lines_in_file > 0:
+            self.file.write('\n')
+        self.file.write(text)
+        self.lines_in_file += 1
+
+    # position to resume logging from, once everything logged so far is on disk
+    def checkpoint(self) -> dict:
+        size = 0
+        if self.file is not None:
+            self.file.flush()
+            size = self.file.tell()
+        return {'logs_written': self.logs_written, 'lines_in_file': self.lines_in_file, 'size': size}
+
+    # continue the numbered files from a checkpoint, dropping whatever the partial file got after it.
+    # If the partial file is gone or shorter, start it over
+    def resume(self, position: dict):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.logs_written = position['logs_written']
+        try:
+            intact = os.path.getsize(self.partial_filename()) >= position['size']
+        except FileNotFoundError:
+            intact = False
+        if not intact:
+            self.open()
+            return
+
+        with open(self.partial_filename(), 'r+') as file:
+            file.truncate(position['size'])
+        self.file = open(self.partial_filename(), 'a', buffering=1 << 16)
+        self.lines_in_file = position['lines_in_file']
+
+    # finish the current numbered file under its name
+    def write(self, name: str):
+        self.echo('')
+        if not self.files:
+            return
+        if self.file is None:
+            self.open()
+        self.file.close()
+        os.replace(self.partial_filename(), f'{self.directory}{self.logs_written:02d}_{name}.txt')
+        self.file = None
+        self.logs_written += 1
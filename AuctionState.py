@@ -1,26 +1,35 @@
 import pricing
 import misc
+import IncrementalScore
+import ExactSolver
+import annealing
 import statistics
 import random
+import heapq
 # import cProfile
 from typing import List, Tuple
 import os
+import time
+import RunStats
+import AuctionLog
+import input_cache
+import Roster
+import RotationSchedule
+import Evaluation
+import checkpoint
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import ArrayEngine
+except ImportError:  # numpy not installed, score with the list path
+    ArrayEngine = None
 Matrix = List[List[float]]
 
 
-class Unit:
-    def __init__(self, name: str, recruit_order: int):
-        self.name = name
-        self.recruit_order = recruit_order
-        self.owner = -1
-        self.bids = []
-        # whenever iterating over bids, we also iterate over Units
-        # Simplify loops and save on zips by storing the bids in the Units
-
-
 class AuctionState:
     def __init__(self):
         self.players = []
+        # bids, owners and teams live in the roster, units are views of its rows
+        self.roster = Roster.Roster([], 0)
         self.units = []
 
         self.max_team_size = 0
@@ -30,318 +39,729 @@ class AuctionState:
         self.bid_sums = []
 
         self.synergies = []
-        # P x U x U, players choose value to reduce/increase value of unit pairs
+        # per player, {(u_i, u_j): value} for the nonzero entries of a U x U matrix.
+        # players choose value to reduce/increase value of unit pairs
         # generally negative for redundant units
-        # increment value of team by manual_synergy[i][j][valuer] if i and j on same team
-        # should be triangular matrix since synergy i<->j == j<->i
+        # increment value of team by synergies[valuer][(i, j)] if i and j on same team
+        # should be triangular matrix since synergy i<->j == j<->i, only i < j entries are used
+
+        # P x U lists of (other unit, synergy), nonzero upper triangle entries only, listed under both units.
+        # Built from synergies on first use, cleared whenever units or synergies change
+        self.synergy_adjacency = None
+        # per player, the synergies read from their file, None for players given medians. Indexed as loaded,
+        # before any units are removed
+        self.declared_synergies = []
+        # inputs() with declared_synergies as load() left them, before any units are removed
+        self.loaded_inputs = {}
 
         self.game_dir = ''
         self.auct_dir = ''
-        self.log_strings = []
-        self.logs_written = 0
+        # numbered output files, streamed as lines are logged
+        self.log = AuctionLog.AuctionLog()
+
+        self.robust_factor = 0.25
+        # processes for the rotation phase, 1 runs the serial search
+        self.rotation_workers = 1
+        # most players in a single rotation, 0 for no limit. Rotations grow factorially with players
+        self.max_rotation_size = 0
+        # swap to a fixed point by always taking the best swap from a queue of cached gains (SwapQueue),
+        # instead of taking each improving swap found by scanning pairs in recruit order
+        self.best_improvement_swaps = False
+        # serial rotation search in the order RotationSchedule learns from observed gains,
+        # instead of lexicographic laps
+        self.adaptive_rotation_order = False
+        # after the heuristic phases, branch and bound for the optimal allocation within these budgets (0 for none)
+        self.use_exact_solver = False
+        self.exact_node_budget = 1000000
+        self.exact_time_budget = 60
+        # seconds from the start of run() for the optimization phases, 0 for no limit.
+        # Phases stop cleanly once it passes, and the outputs use the best allocation found so far
+        self.time_budget = 0
+        self.deadline = 0
+        self.cut_short = False
+        # the swap and rotation phases save output/checkpoint.pickle at most this often (seconds), 0 for never.
+        # With resume, run() continues from a checkpoint that matches the input files instead of starting over.
+        # The checkpoint is removed once a run finishes
+        self.checkpoint_interval = 60
+        self.resume = False
+        self.checkpoint_phase = None
+        self.last_checkpoint = 0
+        self.resume_position = {}
+        # simulated annealing chains replacing the swap and rotation phases, 0 to hill climb instead.
+        # chain c is seeded anneal_seed + c, seed 0 starts from the initial assignment
+        self.anneal_chains = 0
+        self.anneal_workers = 1
+        self.anneal_iterations = 20000
+        self.anneal_start_temperature = 1.0
+        self.anneal_end_temperature = 0.01
+        self.anneal_seed = 0
+        # vectorized get_score, built once units are final. Set False to always use the list path
+        self.use_array_engine = ArrayEngine is not None
+        self.array_engine = None
+        # parsed inputs cached under the auction directory, rebuilt when any input file changes.
+        # Dummy players' randomized bids are cached with them, so repeated runs see the same bids
+        self.use_input_cache = True
+        # the final allocation as reported by run(), also exported to output/evaluation.json, matrices.csv and teams.csv
+        self.evaluation = None
+        # timings and counters written to output/stats.json, cheap enough to leave on
+        self.stats = RunStats.RunStats()
 
     # need to print as the auction runs, not just when a log is ready for the next output file
-    def print_and_log(self, text: str):
-        print(text)
-        self.log_strings.append(text)
+    def print_and_log(self, text: str, level: int = AuctionLog.SUMMARY, progress: bool = False):
+        self.log.log(text, level, progress)
 
     def write_logs(self, filename: str):
-        print()
-        file = open(f'{self.auct_dir}output/{self.logs_written:02d}_{filename}.txt', 'w')
-        file.write('\n'.join(self.log_strings))
-        file.close()
-        self.log_strings = []
-        self.logs_written += 1
+        self.log.write(filename)
     
     def format_bids(self):
         self.print_and_log('--BIDS--        ' + ' '.join([f'{player:10s}' for player in self.players]))
         for unit in self.units:
             self.print_and_log(f'{unit.name:15s}' + ' '.join([f' {bid:5.2f}    ' for bid in unit.bids]))
 
+    # median over the players so far, only pairs someone declared can have a nonzero median
     def set_median_synergy(self):
-        print(f'Setting median synergies for {self.players[len(self.synergies)]}')
-        player_synergies = []
-        for u_i in range(len(self.units)):
-            next_synergy_row = []
-            if len(self.synergies) > 0:
-                for u_j in range(len(self.units)):
-                    next_synergy_row.append(statistics.median([synergy[u_i][u_j] for synergy in self.synergies]))
-            else:
-                next_synergy_row = [0] * len(self.units)
-            player_synergies.append(next_synergy_row)
+        self.log.echo(f'Setting median synergies for {self.players[len(self.synergies)]}')
+        declared_pairs = set()
+        for synergies in self.synergies:
+            declared_pairs.update(synergies)
+
+        player_synergies = {}
+        for pair in sorted(declared_pairs):
+            median = statistics.median([synergies.get(pair, 0) for synergies in self.synergies])
+            if median != 0:
+                player_synergies[pair] = median
         self.synergies.append(player_synergies)
 
     # checks that populated section of the matrix is triangular
     def format_synergy(self, player_i: int):
         self.print_and_log(f'  Synergies for {self.players[player_i]}')
 
-        for u_i in range(len(self.units)):
-            something_to_print = False
+        rows = {}
+        for (u_i, u_j), synergy in sorted(self.synergies[player_i].items()):
+            rows.setdefault(u_i, []).append((u_j, synergy))
+
+        for u_i, row in rows.items():
             unit_line = f'{self.units[u_i].name:12s}: '
-            for u_j, synergy in enumerate(self.synergies[player_i][u_i]):
-                if synergy != 0:
-                    something_to_print = True
-                    unit_line += f' {self.units[u_j].name:12s}{synergy:5.2f} '
-                    if u_j <= u_i:
-                        self.print_and_log('NOTE, synergy matrix not triangular, possible error')
-            if something_to_print:
-                self.print_and_log(unit_line)
+            for u_j, synergy in row:
+                unit_line += f' {self.units[u_j].name:12s}{synergy:5.2f} '
+                if u_j <= u_i:
+                    self.print_and_log('NOTE, synergy matrix not triangular, possible error')
+            self.print_and_log(unit_line)
 
-    def remove_least_valued_unit(self):
+    def least_valued_unit(self) -> Tuple[int, float]:
         least_value = 99999
         least_value_i = -1
         for unit in self.units:
             if least_value > sum(unit.bids):
                 least_value = sum(unit.bids)
                 least_value_i = unit.recruit_order
+        return least_value_i, least_value
 
-        for unit in self.units[least_value_i:]:
-            unit.recruit_order -= 1
-
+    def remove_least_valued_unit(self):
+        least_value_i, least_value = self.least_valued_unit()
         self.print_and_log(f'Removing least valued: {self.units[least_value_i].name} {least_value/len(self.players)}')
-        self.units.pop(least_value_i)
-        for player_synergy in self.synergies:
-            player_synergy.pop(least_value_i)
-            for row in player_synergy:
-                row.pop(least_value_i)
+        self.remove_unit(least_value_i)
+
+    def remove_unit(self, removed_i: int):
+        self.roster.remove(removed_i)
+        self.units.pop(removed_i)
+        self.array_engine = None
+        self.synergy_adjacency = None
+
+        def remap(u: int) -> int:
+            return u - 1 if u > removed_i else u
+
+        self.synergies = [{(remap(u_i), remap(u_j)): synergy for (u_i, u_j), synergy in synergies.items()
+                           if removed_i not in (u_i, u_j)}
+                          for synergies in self.synergies]
 
     # assign units in order of satisfaction, not recruitment
+    # comp_sat never changes during assignment, so heap every (unit, player) candidate once and
+    # drop candidates for assigned units or full teams as they surface.
+    # Ties go to the earlier unit, then the earlier player
     def format_initial_assign(self):
         self.print_and_log('---Initial assignments---')
 
         team_sizes = [0] * len(self.players)
-        team_sizes.append(len(self.units))  # all unassigned (team -1)
 
         for unit in self.units:
             unit.owner = -1
-        
-        while team_sizes[-1] > 0:  # unassigned units remain
-            max_sat = -99999
-            max_sat_unit = Unit('NULL', -1)
-            max_sat_player = -1
-            for unit in self.units:
-                if unit.owner == -1:
-                    for p, bid in enumerate(unit.bids):
-                        sat = pricing.comp_sat(unit.bids, p)
-                        if team_sizes[p] < self.max_team_size and max_sat < sat:
-                            max_sat = sat
-                            max_sat_unit = unit
-                            max_sat_player = p
-
-            team_sizes[max_sat_unit.owner] -= 1
-            max_sat_unit.owner = max_sat_player
-            team_sizes[max_sat_unit.owner] += 1
-            self.print_and_log(f'{max_sat_unit.name:12s} to {max_sat_player} {self.players[max_sat_player]:12s}')
-
-    def teams(self) -> List[List[Unit]]:
-        teams = [[] for _ in self.players]
 
-        for unit in self.units:
-            teams[unit.owner].append(unit)
-        return teams
+        candidates = [(-pricing.comp_sat(unit.bids, p), u, p)
+                      for u, unit in enumerate(self.units) for p in range(len(self.players))]
+        heapq.heapify(candidates)
+
+        while candidates:
+            _, u, p = heapq.heappop(candidates)
+            unit = self.units[u]
+            if unit.owner != -1 or team_sizes[p] >= self.max_team_size:
+                continue
+
+            unit.owner = p
+            team_sizes[p] += 1
+            self.print_and_log(f'{unit.name:12s} to {p} {self.players[p]:12s}')
 
-    def format_teams(self):
+    def teams(self) -> List[List[Roster.Unit]]:
+        if self.stats.enabled:
+            self.stats.counts['teams'] += 1
+        return self.roster.teams()
+
+    def format_teams(self, evaluation: Evaluation.Evaluation = None):
+        evaluation = evaluation or self.evaluate()
         self.print_and_log('---Teams---')
         self.print_and_log(' '.join([f'{player:12s}' for player in self.players]))
 
-        teams = self.teams()
         for i in range(self.max_team_size):
-            self.print_and_log(' '.join([f'{(team[i].name[:12]):12s}' for team in teams]))
+            self.print_and_log(' '.join([f'{(team[i][:12]):12s}' for team in evaluation.teams]))
 
-        self.print_and_log(' '.join([f'{price:5.2f}       ' for price in self.handicaps()]))
+        self.print_and_log(' '.join([f'{price:5.2f}       ' for price in evaluation.handicaps]))
 
-    # How player i values player j's team. No adjustments
-    def value_matrix(self) -> Matrix:
+    # How player i values player j's team. No adjustments.
+    # The matrix functions below read the live owners unless given an owner vector like owners()
+    def value_matrix(self, owners: List[int] = None) -> Matrix:
+        if owners is None:
+            owners = self.owners()
         v_matrix = [([0] * len(self.players)) for _ in self.players]
 
-        for unit in self.units:
+        for unit, owner in zip(self.units, owners):
             for valuer_row, bid in zip(v_matrix, unit.bids):
-                valuer_row[unit.owner] += bid
+                valuer_row[owner] += bid
 
         return v_matrix
 
-    # Could avoid recalculating in some circumstances, but these are not common;
-    # at minimum, when a unit is reassigned, need to check for synergy relationship with new teammates;
-    # also when leaving a team; can't save from that unit's prior swap because other teammates may have changed.
-    # Depends on synergy relationship graph density, but on tests with FE8:
-    # 54993/55440 calls to synergy_matrix() required a recalculation, implying very few reassignments meet
-    # the circumstances of having no former or current teammates as connected to any moving unit.
-    # If no synergy relationships, much faster on FE6, but cannot conclude any speedup in general.
-    # Could also only update rows/columns of affected players, but most time is all-player rotations
-    def synergy_matrix(self) -> Matrix:
+    def synergy_links(self) -> List[List[List[Tuple[int, float]]]]:
+        if self.synergy_adjacency is None:
+            self.synergy_adjacency = []
+            for synergies in self.synergies:
+                links = [[] for _ in self.units]
+                for (u_i, u_j), synergy in sorted(synergies.items()):
+                    if u_i < u_j:
+                        links[u_i].append((u_j, synergy))
+                        links[u_j].append((u_i, synergy))
+                self.synergy_adjacency.append(links)
+        return self.synergy_adjacency
+
+    # On tests with FE8, 54993/55440 calls to a team-by-team synergy_matrix() needed a full recalculation,
+    # and each cost O(T^2 P^2) even though most synergy entries are zero.
+    # Walk the nonzero links instead, and let IncrementalScore keep the columns current as units move.
+    def synergy_matrix(self, owners: List[int] = None) -> Matrix:
+        if self.stats.enabled:
+            self.stats.counts['synergy_matrix'] += 1
+        if owners is None:
+            owners = self.owners()
         s_matrix = [([0] * len(self.players)) for _ in self.players]
 
-        teams = self.teams()
-        for u_i in range(self.max_team_size):
-            for u_j in range((u_i+1), self.max_team_size):
-                for player_i, synergies in enumerate(self.synergies):
-                    for player_j, team in enumerate(teams):
-                        s_matrix[player_i][player_j] += synergies[team[u_i].recruit_order][team[u_j].recruit_order]
+        for player_i, links in enumerate(self.synergy_links()):
+            for u_i, unit_links in enumerate(links):
+                owner = owners[u_i]
+                for u_j, synergy in unit_links:
+                    if u_i < u_j and owner == owners[u_j]:
+                        s_matrix[player_i][owner] += synergy
 
         return s_matrix
 
-    def v_s_matrix(self) -> Matrix:
-        v_matrix = self.value_matrix()
-        s_matrix = self.synergy_matrix()
-        for v_row, s_row in zip(v_matrix, s_matrix):
+    def v_s_matrix(self, owners: List[int] = None) -> Matrix:
+        return self.add_synergy(self.value_matrix(owners), self.synergy_matrix(owners))
+
+    # new matrix, the inputs are left as they are
+    @staticmethod
+    def add_synergy(v_matrix: Matrix, s_matrix: Matrix) -> Matrix:
+        v_s = [list(v_row) for v_row in v_matrix]
+        for v_row, s_row in zip(v_s, s_matrix):
             for i in range(len(v_row)):
                 v_row[i] += s_row[i]
                 v_row[i] = max(0.0, v_row[i])  # team value should never be negative
-        return v_matrix
+        return v_s
 
     # Adjusted for synergy and redundancy
-    def final_matrix(self) -> Matrix:
-        return pricing.apply_redundancy(self.v_s_matrix(), self.bid_sums)
+    def final_matrix(self, owners: List[int] = None) -> Matrix:
+        return pricing.apply_redundancy(self.v_s_matrix(owners), self.bid_sums)
 
     def handicaps(self) -> List[float]:
         return pricing.pareto_prices(self.final_matrix())
 
+    # every matrix layer of the current allocation built once, for all the reports on it
+    def evaluate(self) -> Evaluation.Evaluation:
+        owners = self.owners()
+        v_matrix = self.value_matrix(owners)
+        s_matrix = self.synergy_matrix(owners)
+        v_s_matrix = self.add_synergy(v_matrix, s_matrix)
+        final_matrix = pricing.apply_redundancy([list(row) for row in v_s_matrix], self.bid_sums)
+        teams = [[unit.name for unit in team] for team in self.teams()]
+        return Evaluation.Evaluation.from_matrices(self.players, teams, owners, v_matrix, s_matrix, v_s_matrix,
+                                                   final_matrix, self.robust_factor, self.cut_short)
+
     # Print matrix, comp_sat, handicaps, and matrix+sat after handicapping
-    def format_value_matrices(self):
+    def format_value_matrices(self, evaluation: Evaluation.Evaluation = None):
+        evaluation = evaluation or self.evaluate()
         self.print_and_log('           ' +
                            ' '.join([f'{player:10s}' for player in self.players]) +
                            ' Comparative satisfaction')
 
-        def print_matrix(mat: Matrix, string: str):
+        def print_matrix(mat: Matrix, sats: List[float], string: str):
             self.print_and_log('')
             self.print_and_log(string)
             for p, row in enumerate(mat):
                 self.print_and_log(f'{self.players[p]:10s} ' +
                                    ' '.join([f' {value:6.2f}   ' for value in row]) +
-                                   f'  {pricing.comp_sat(row, p):6.2f}')
-
-        print_matrix(self.value_matrix(), 'Unadjusted value matrix')
-        print_matrix(self.synergy_matrix(), 'Synergy')
-        print_matrix(self.v_s_matrix(), 'Synergy adjusted')
-        final_matrix = self.final_matrix()
-        print_matrix(final_matrix, 'Redundancy adjusted')
+                                   f'  {sats[p]:6.2f}')
 
-        robustness = 0
-        for p, row in enumerate(final_matrix):
-            for i, value in enumerate(row):
-                if p == i:
-                    robustness += value
+        for layer, string in zip(Evaluation.LAYERS,
+                                 ('Unadjusted value matrix', 'Synergy', 'Synergy adjusted', 'Redundancy adjusted')):
+            print_matrix(evaluation.matrices[layer], evaluation.comp_sats[layer], string)
 
         self.print_and_log('')
-        self.print_and_log(f'Average team robustness: {robustness/len(self.players):6.2f}')
+        self.print_and_log(f'Average team robustness: {evaluation.robustness:6.2f}')
 
-        prices = self.handicaps()
+        self.print_and_log('HANDICAPS: ' + ' '.join([f' {price:6.2f}   ' for price in evaluation.handicaps]))
+        print_matrix(evaluation.handicap_adjusted_matrix(), evaluation.comp_sats['handicap_adjusted'],
+                     'Handicap adjusted')
 
-        self.print_and_log('HANDICAPS: ' + ' '.join([f' {price:6.2f}   ' for price in prices]))
-        self.print_and_log('')
+    def owners(self) -> List[int]:
+        return self.roster.owners.tolist()
 
-        self.print_and_log('Handicap adjusted')
-        for p, row in enumerate(final_matrix):
-            self.print_and_log(f'{self.players[p]:10s} ' +
-                               ' '.join([f' {value - price:6.2f}   ' for value, price in zip(row, prices)]) +
-                               f'  {pricing.comp_sat(row, p) - pricing.comp_sat(prices, p):6.2f}')
+    def build_array_engine(self):
+        if self.use_array_engine and ArrayEngine is not None:
+            self.array_engine = ArrayEngine.ArrayEngine.from_state(self)
 
     def get_score(self):
-        return pricing.allocation_score(self.final_matrix(), 0.25)
+        if self.stats.enabled:
+            self.stats.counts['get_score'] += 1
+        if self.array_engine is not None:
+            return self.array_engine.score(self.roster.owners, self.robust_factor)
+        return pricing.allocation_score(self.final_matrix(), self.robust_factor)
+
+    # Scores K candidate owner vectors (each like owners()) at once, without moving any unit.
+    # Returns the allocation_score of each, or with handicaps=True (scores, pareto_prices of each).
+    # The array engine takes chunk_size candidates per call to bound its K x U x P intermediate arrays,
+    # without numpy each candidate goes through final_matrix(owners)
+    def score_allocations(self, candidates: List[List[int]], handicaps: bool = False, chunk_size: int = 1024):
+        if self.stats.enabled:
+            self.stats.counts['score_allocations'] += 1
+            self.stats.counts['scored_candidates'] += len(candidates)
+        if self.array_engine is None:
+            self.build_array_engine()
+
+        scores = []
+        prices = []
+        if self.array_engine is not None:
+            for start in range(0, len(candidates), chunk_size):
+                finals = self.array_engine.final_matrices(candidates[start:start + chunk_size])
+                scores.extend(self.array_engine.scores(finals, self.robust_factor).tolist())
+                if handicaps:
+                    prices.extend(self.array_engine.handicaps(finals).tolist())
+        else:
+            for owners in candidates:
+                final_matrix = self.final_matrix(owners)
+                scores.append(pricing.allocation_score(final_matrix, self.robust_factor))
+                if handicaps:
+                    prices.append(pricing.pareto_prices(final_matrix))
+
+        if handicaps:
+            return scores, prices
+        return scores
+
+    # Every phase only ever adopts improvements, so stopping at any check leaves the best allocation found so far
+    def out_of_time(self) -> bool:
+        if self.deadline and not self.cut_short and time.perf_counter() > self.deadline:
+            self.cut_short = True
+            self.print_and_log('Time budget reached, stopping optimization.')
+        return self.cut_short
 
     # try all swaps to improve score
+    # only the two teams involved change, so score each swap from the columns it touches
     def improve_allocation_swaps(self) -> bool:
-        current_score = self.get_score()
+        scorer = IncrementalScore.IncrementalScore(self)
         swapped = False
 
         for u_i, unit_i in enumerate(self.units):
-            for unit_j in self.units[u_i+1:]:
-                if unit_i.owner != unit_j.owner:
+            if self.out_of_time():
+                break
+            for u_j in range(u_i+1, len(self.units)):
+                unit_j = self.units[u_j]
+                if unit_i.owner != unit_j.owner and scorer.swap_gain(u_i, u_j) > IncrementalScore.MIN_GAIN:
+                    scorer.swap(u_i, u_j)
                     unit_i.owner, unit_j.owner = unit_j.owner, unit_i.owner
+                    swapped = True
+                    if self.stats.enabled:
+                        self.stats.counts['swaps_accepted'] += 1
+                    # Use name of owner before swap
+                    self.print_and_log(f'Swapping {self.players[unit_j.owner]:12s} '
+                                       f'{(unit_i.name[:12]):12s} <-> {(unit_j.name[:12]):12s} '
+                                       f'{self.players[unit_i.owner]:12s}, '
+                                       f'new score {scorer.score:7.3f}')
+        return swapped
+
+    # best-improvement swaps to a fixed point, True if any swap was made
+    def improve_allocation_best_swaps(self) -> bool:
+        queue = IncrementalScore.SwapQueue(IncrementalScore.IncrementalScore(self))
+        swapped = False
 
-                    if current_score < self.get_score():
-                        current_score = self.get_score()
-                        swapped = True
-                        # Use name of owner before swap
-                        self.print_and_log(f'Swapping {self.players[unit_j.owner]:12s} '
-                                           f'{(unit_i.name[:12]):12s} <-> {(unit_j.name[:12]):12s} '
-                                           f'{self.players[unit_i.owner]:12s}, '
-                                           f'new score {current_score:7.3f}')
-                    else:  # return units to owners
-                        unit_i.owner, unit_j.owner = unit_j.owner, unit_i.owner
+        best = queue.pop()
+        while best is not None and not self.out_of_time():
+            _, u_i, u_j = best
+            unit_i = self.units[u_i]
+            unit_j = self.units[u_j]
+            queue.swap(u_i, u_j)
+            unit_i.owner, unit_j.owner = unit_j.owner, unit_i.owner
+            swapped = True
+            if self.stats.enabled:
+                self.stats.counts['swaps_accepted'] += 1
+            self.print_and_log(f'Swapping {self.players[unit_j.owner]:12s} '
+                               f'{(unit_i.name[:12]):12s} <-> {(unit_j.name[:12]):12s} '
+                               f'{self.players[unit_i.owner]:12s}, '
+                               f'new score {queue.scorer.score:7.3f}')
+            if self.checkpoint_phase == 'swaps':
+                self.save_checkpoint()
+            best = queue.pop()
+
+        if self.stats.enabled:
+            self.stats.counts['swap_terms'] += queue.evaluations
         return swapped
 
+    def log_rotation(self, rotation: Tuple[int], traded_units: List[Roster.Unit], score: float):
+        self.print_and_log('')
+        self.print_and_log('Rotating:')
+        for unit in traded_units:
+            # units have already moved, giver is the player rotating to the new owner
+            giver = rotation.index(unit.owner)
+            self.print_and_log(f'{self.players[giver]:12s} -> '
+                               f'{(unit.name[:12]):12s} -> '
+                               f'{self.players[unit.owner]:12s}')
+        self.print_and_log(f'New score {score:7.3f}')
+        self.print_and_log('')
+
     # try all rotations (swaps of three or more) to improve score
     # iterate over rotations at the highest level,
-    # skip branching tree if player at that level of recursion isn't trading
+    # only trading players branch, one level of recursion each
     # only full p rotations will cost much time
 
     # If this didn't rotate from rotations[test_until], only need to check until that point:
     # Complete one "lap" without any successful rotation, lap doesn't need to start at rotation[0]
     # Set last_rotation to index r whenever a rotation occurs to pass to next execution.
-    def improve_allocation_rotate(self, test_until_i: int, rotations: List[Tuple[int]]) -> int:
-        current_score = self.get_score()
-        last_rotation_i = -1
-
-        indices = [0]*len(self.players)  # of units being traded from 0~teamsize-1, set during recursive_rotate branch
-        teams = self.teams()
-
-        def recursive_rotate(p_i):
+    # Branch and bound: a rotation's gain is a sum of per-receiver terms (see IncrementalScore.RotationBounds),
+    # so skip any branch whose chosen terms plus the best remaining terms cannot improve the score.
+    # A lap resumed from a checkpoint starts at rotation start_i, with the last_rotation_i it had reached.
+    # With a schedule, rotations come in its order until it has had a full lap without improvement
+    # instead, and test_until_i and start_i are unused
+    def improve_allocation_rotate(self, test_until_i: int, rotations: List[Tuple[int]],
+                                  start_i: int = 0, last_rotation_i: int = -1,
+                                  schedule: RotationSchedule.RotationSchedule = None) -> int:
+
+        positions = [0]*len(self.players)  # of units being traded from 0~teamsize-1, set during recursive_rotate
+        outgoing = [-1]*len(self.players)  # the units at those positions, -1 until chosen
+        scorer = IncrementalScore.IncrementalScore(self)
+        teams = [list(team) for team in self.roster.team_index]
+
+        def recursive_rotate(t_i):
+            nonlocal scorer
             nonlocal teams
-            nonlocal current_score
+            nonlocal bounds
             nonlocal last_rotation_i
-
-            if p_i >= len(self.players):  # base case
+            nonlocal improved
+            nonlocal score_before
+
+            if self.stats.enabled:
+                self.stats.counts['recursive_rotate_calls'] += 1
+            if t_i >= len(trading_players):  # base case, bound is exact and improving
+                if schedule is not None and not improved:  # the schedule's gain, only scored when there is one
+                    score_before = self.get_score()
                 for p in trading_players:
-                    teams[p][indices[p]].owner = rotation[p]  # p's unit goes to rotation[p]
-
-                if current_score < self.get_score():
-                    current_score = self.get_score()
-
-                    self.print_and_log('')
-                    self.print_and_log('Rotating:')
-                    for p2 in trading_players:
-                        self.print_and_log(f'{self.players[p2]:12s} -> '
-                                           f'{(teams[p2][indices[p2]].name[:12]):12s} -> '
-                                           f'{self.players[rotation[p2]]:12s}')
-                    self.print_and_log(f'New score {current_score:7.3f}')
-                    self.print_and_log('')
-
-                    while self.improve_allocation_swaps():
-                        pass
-                    current_score = self.get_score()
-
-                    teams = self.teams()
-                    last_rotation_i = r_i
-                else:
-                    for p in trading_players:
-                        teams[p][indices[p]].owner = p  # unrotate, if teams were updated rotates to new teams
-
-            else:
-                if p_i in trading_players:
-                    for indices[p_i] in range(self.max_team_size):  # for each unit in the team
-                        recursive_rotate(p_i + 1)
-                else:  # don't branch, this player isn't trading in this rotation, go to next player
-                    recursive_rotate(p_i + 1)
-
-        for r_i, rotation in enumerate(rotations):
-            if r_i > test_until_i and last_rotation_i < 0:
-                self.print_and_log('Reached latest effected rotation of prior loop. Stopping rotation early.')
+                    self.units[outgoing[p]].owner = rotation[p]  # p's unit goes to rotation[p]
+                self.log_rotation(rotation, [self.units[outgoing[p]] for p in trading_players], self.get_score())
+
+                self.swap_phase()
+
+                scorer = IncrementalScore.IncrementalScore(self)
+                teams = [list(team) for team in self.roster.team_index]
+                bounds = IncrementalScore.RotationBounds(scorer, rotation, teams)
+                for p in trading_players:  # keep searching from the same positions of the new teams
+                    outgoing[p] = teams[p][positions[p]]
+                last_rotation_i = r_i
+                improved = True
+                if self.stats.enabled:
+                    self.stats.counts['rotations_accepted'] += 1
+                return
+
+            p = trading_players[t_i]
+            for positions[p] in range(self.max_team_size):  # for each unit in the team, teams may change while looping
+                if self.out_of_time():
+                    break
+                outgoing[p] = teams[p][positions[p]]
+                if bounds.bound(outgoing) > IncrementalScore.MIN_GAIN:
+                    # later players' units are only chosen below this level
+                    for later in trading_players[t_i+1:]:
+                        outgoing[later] = -1
+                    recursive_rotate(t_i + 1)
+            outgoing[p] = -1
+
+        for r_i in (range(start_i, len(rotations)) if schedule is None else schedule):
+            rotation = rotations[r_i]
+            self.save_checkpoint({'num_rotations': len(rotations), 'rotation_i': r_i,
+                                  'test_until': test_until_i, 'last_rotation_i': last_rotation_i,
+                                  'adaptive': schedule is not None, 'schedule': schedule})
+            if self.out_of_time():
+                return -1
+            if schedule is None and r_i > test_until_i and last_rotation_i < 0:
+                self.print_and_log('Reached latest effected rotation of prior loop. Stopping rotation early.',
+                                   AuctionLog.VERBOSE)
                 return last_rotation_i
 
             trading_players = [p for p, r in enumerate(rotation) if p != r]
             self.print_and_log(f'{r_i:3d}/{len(rotations):3d}  '
                                f'Rotation {rotation}  '
-                               f'Trading players {trading_players}')
-            recursive_rotate(0)
+                               f'Trading players {trading_players}', AuctionLog.VERBOSE, progress=True)
+            bounds = IncrementalScore.RotationBounds(scorer, rotation, teams)
+            improved = False
+            score_before = 0
+            if self.stats.enabled:
+                start = time.perf_counter()
+                recursive_rotate(0)
+                self.stats.add_rotation(rotation, time.perf_counter() - start)
+            else:
+                recursive_rotate(0)
+            if schedule is not None:
+                schedule.record(r_i, improved, self.get_score() - score_before if improved else 0)
+
+        return last_rotation_i if schedule is None else -1
+
+    # Evaluate every rotation against the current allocation across the pool, apply the best improving one,
+    # then swap to a fixed point as the serial version does. False when no rotation improves.
+    def improve_allocation_rotate_parallel(self, rotations: List[Tuple[int]], pool: ProcessPoolExecutor) -> bool:
+        owners = self.owners()
+        indexed_rotations = list(enumerate(rotations))
+        num_chunks = self.rotation_workers * 4  # round robin chunks, full p rotations cost the most
+        # workers can't read perf_counter deadlines, send one in wall clock time
+        deadline = time.time() + self.deadline - time.perf_counter() if self.deadline else 0
+        futures = [pool.submit(IncrementalScore.best_rotation_of, owners, indexed_rotations[c::num_chunks], deadline)
+                   for c in range(num_chunks)]
+
+        best = (0, -1, [])
+        for future in futures:
+            gain, r_i, outgoing = future.result()
+            if gain > best[0] or (gain == best[0] and 0 <= r_i < best[1]):
+                best = (gain, r_i, outgoing)
+
+        gain, r_i, outgoing = best
+        if r_i < 0:
+            # workers stop searching at the deadline, so past it an empty round is not a fixed point
+            self.out_of_time()
+            return False
+
+        rotation = rotations[r_i]
+        traded_units = []
+        for p, r in enumerate(rotation):
+            if p != r:
+                self.units[outgoing[p]].owner = r
+                traded_units.append(self.units[outgoing[p]])
+        self.print_and_log(f'{r_i:3d}/{len(rotations):3d}  Rotation {rotation}  best of pool')
+        self.log_rotation(rotation, traded_units, self.get_score())
+        if self.stats.enabled:
+            self.stats.counts['rotations_accepted'] += 1
+
+        self.swap_phase()
+        return True
+
+    # swaps to a fixed point
+    def swap_phase(self):
+        if self.best_improvement_swaps:
+            self.improve_allocation_best_swaps()
+            return
+        while self.improve_allocation_swaps():
+            if self.checkpoint_phase == 'swaps':
+                self.save_checkpoint()
+
+    # rotations until a full lap finds no improvement
+    def rotation_phase(self):
+        rotations = misc.one_loop_permutations(len(self.players), self.max_rotation_size)
+        if self.rotation_workers > 1:
+            with ProcessPoolExecutor(self.rotation_workers, initializer=IncrementalScore.init_worker,
+                                     initargs=(IncrementalScore.IncrementalScore(self),)) as pool:
+                while not self.out_of_time() and self.improve_allocation_rotate_parallel(rotations, pool):
+                    self.save_checkpoint()
+            return
+
+        # a checkpoint's position only applies to the same rotations searched in the same order, else a fresh lap
+        resumable = (self.resume_position.get('num_rotations') == len(rotations) and
+                     self.resume_position.get('adaptive', False) == self.adaptive_rotation_order)
+        if self.adaptive_rotation_order:
+            schedule = self.resume_position['schedule'] if resumable else RotationSchedule.RotationSchedule(rotations)
+            self.improve_allocation_rotate(-1, rotations, schedule=schedule)
+        else:
+            test_until = len(rotations)
+            start_i = 0
+            last_rotation_i = -1
+            if resumable:
+                test_until = self.resume_position['test_until']
+                start_i = self.resume_position['rotation_i']
+                last_rotation_i = self.resume_position['last_rotation_i']
+            while test_until >= 0:
+                test_until = self.improve_allocation_rotate(test_until, rotations, start_i, last_rotation_i)
+                start_i = 0
+                last_rotation_i = -1
+
+    # Run annealing chains from the current allocation, across a process pool if more than one worker.
+    # Adopts the best allocation any chain saw, then swaps to a fixed point
+    def improve_allocation_annealing(self):
+        scorer = IncrementalScore.IncrementalScore(self)
+        owners = self.owners()
+        seeds = [self.anneal_seed + c for c in range(self.anneal_chains)]
+        args = (self.anneal_iterations, self.anneal_start_temperature, self.anneal_end_temperature)
+
+        if self.anneal_workers > 1:
+            with ProcessPoolExecutor(self.anneal_workers, initializer=IncrementalScore.init_worker,
+                                     initargs=(scorer,)) as pool:
+                results = list(pool.map(annealing.anneal_in_worker,
+                                        [owners] * len(seeds), seeds, *[[arg] * len(seeds) for arg in args]))
+        else:
+            results = [annealing.anneal(scorer, owners, seed, *args) for seed in seeds]
+
+        best_score = self.get_score()
+        best_owners = owners
+        for seed, (score, chain_owners) in zip(seeds, results):
+            self.print_and_log(f'Annealing chain seed {seed:3d}: best score {score:7.3f}')
+            if score > best_score:
+                best_score, best_owners = score, chain_owners
+
+        for unit, owner in zip(self.units, best_owners):
+            unit.owner = owner
+        self.print_and_log(f'Annealing best score {self.get_score():7.3f}')
+        self.print_and_log('')
+        self.swap_phase()
+
+    # Seeded with the current allocation, adopts anything better the solver finds.
+    # Reports the proven upper bound on the best score and the remaining gap
+    def improve_allocation_exact(self) -> bool:
+        time_budget = self.exact_time_budget
+        if self.deadline:
+            if self.out_of_time():
+                return False
+            remaining = self.deadline - time.perf_counter()
+            time_budget = min(time_budget, remaining) if time_budget > 0 else remaining
+        solver = ExactSolver.ExactSolver(IncrementalScore.IncrementalScore(self), self.max_team_size,
+                                         self.exact_node_budget, time_budget)
+        start_score = solver.best_score
+        solver.solve()
+        if not solver.proven:  # stopped by the run's deadline rather than its own budgets, the outputs note it
+            self.out_of_time()
+
+        improved = solver.best_score > start_score
+        if improved:
+            for unit, owner in zip(self.units, solver.best_owners):
+                unit.owner = owner
+
+        self.print_and_log('')
+        self.print_and_log(f'Exact search: {solver.nodes} nodes, '
+                           f'score {start_score:7.3f} -> {solver.best_score:7.3f}, '
+                           f'upper bound {solver.upper_bound:7.3f}, gap {solver.gap:7.3f}' +
+                           (', optimal' if solver.proven else ', budget exhausted'))
+        return improved
+
+    # position holds where the rotation phase is within its lap, empty elsewhere
+    def save_checkpoint(self, position: dict = None):
+        if (self.checkpoint_interval <= 0 or self.checkpoint_phase is None or
+                time.perf_counter() - self.last_checkpoint < self.checkpoint_interval):
+            return
+        self.last_checkpoint = time.perf_counter()
+        if self.stats.enabled:
+            self.stats.counts['checkpoints'] += 1
+        checkpoint.write(self.log.directory, self.input_files(),
+                         {'bid_sums': self.bid_sums, 'units': [unit.name for unit in self.units],
+                          'owners': self.owners(), 'score': self.get_score(), 'phase': self.checkpoint_phase,
+                          'position': position or {}, 'log': self.log.checkpoint()})
+
+    # After load(), picks up a checkpoint of the same inputs: removes the same units without logging again,
+    # restores owners and the log files, and returns the phase to continue. None if there is nothing to resume
+    def restore_checkpoint(self) -> str:
+        saved = checkpoint.read(self.log.directory, self.input_files())
+        if saved is None or saved['bid_sums'] != self.bid_sums or saved['phase'] not in ('swaps', 'rotations'):
+            return None
+        unit_names = [unit.name for unit in self.units]
+        if not set(saved['units']) <= set(unit_names):
+            return None
+
+        while len(self.units) % len(self.players) != 0:
+            self.remove_unit(self.least_valued_unit()[0])
+        if [unit.name for unit in self.units] != saved['units']:
+            self.load()  # only reached if the removal rule changed, start over with every unit
+            return None
 
-        return last_rotation_i
+        for unit, owner in zip(self.units, saved['owners']):
+            unit.owner = owner
+        self.resume_position = saved['position']
+        self.log.resume(saved['log'])
+        self.print_and_log(f'Resumed {saved["phase"]} from checkpoint, score {self.get_score():7.3f}')
+        return saved['phase']
+
+    def cut_short_note(self) -> str:
+        return f'NOTE, optimization cut short by the {self.time_budget}s time budget, best allocation found so far'
 
     def load(self):
         # directories.txt contains paths as first word, subsequent words may be comments
         # 1st line is game directory, 2nd auction dir, subsequent are synergy filenames
-        directories = [d[0] for d in misc.read_grid('directories.txt', str)]
-        self.game_dir = directories[0]
-        self.auct_dir = directories[1]
-
-        self.units = [Unit(row[0], i) for i, row in enumerate(misc.read_grid(f'{self.auct_dir}units.txt', str))]
-        self.players = misc.read_grid(f'{self.auct_dir}players.txt', str)[0]
+        # unless the directories have already been set
+        if not self.auct_dir:
+            directories = [d[0] for d in misc.read_grid('directories.txt', str, self.log.echo)]
+            self.game_dir = directories[0]
+            self.auct_dir = directories[1]
+        self.log.directory = f'{self.auct_dir}output/'
+
+        if self.use_input_cache:
+            cache = input_cache.read(self.auct_dir)
+            if cache is not None:
+                self.log.echo(f'reading {self.auct_dir}{input_cache.CACHE_FILENAME}')
+                self.set_inputs(cache)
+                self.declared_synergies = cache['declared_synergies']
+                self.loaded_inputs = dict(self.inputs(), declared_synergies=self.declared_synergies)
+                return
+
+        self.parse_inputs()
+        self.loaded_inputs = dict(self.inputs(), declared_synergies=self.declared_synergies)
+
+        if self.use_input_cache:
+            input_cache.write(self.auct_dir, self.input_files(), self.loaded_inputs)
+
+    # parsed inputs as plain data, for the input cache or to rebuild the auction elsewhere
+    def inputs(self) -> dict:
+        return {'units': [unit.name for unit in self.units], 'players': self.players,
+                'bids': self.roster.bid_rows(), 'bid_sums': self.bid_sums, 'synergies': self.synergies}
+
+    def set_inputs(self, inputs: dict):
+        self.players = inputs['players']
+        self.roster = Roster.Roster(inputs['units'], len(self.players))
+        self.units = list(self.roster.units)
+        for unit, bids in zip(self.units, inputs['bids']):
+            unit.bids = bids
         self.max_team_size = len(self.units) // len(self.players)
-        bids = misc.read_grid(f'{self.auct_dir}bids.txt', float)
+        self.bid_sums = inputs['bid_sums']
+        self.synergies = inputs['synergies']
+        self.synergy_adjacency = None
+        self.array_engine = None
+
+    # every file parse_inputs reads, or would read if it existed
+    def input_files(self) -> List[str]:
+        return ([f'{self.auct_dir}{filename}.txt' for filename in ('units', 'players', 'bids')] +
+                [f'{self.auct_dir}synergy_{player}.txt' for player in self.players])
+
+    def parse_inputs(self):
+        unit_names = [row[0] for row in misc.read_grid(f'{self.auct_dir}units.txt', str, self.log.echo)]
+        self.players = misc.read_grid(f'{self.auct_dir}players.txt', str, self.log.echo)[0]
+        self.roster = Roster.Roster(unit_names, len(self.players))
+        self.units = list(self.roster.units)
+        self.max_team_size = len(self.units) // len(self.players)
+        self.parse_bids()
+        self.parse_synergies()
+
+    # previous: bid rows from an earlier parse of the same units, whose dummy bids are kept for unchanged rows
+    def parse_bids(self, previous: List[List[float]] = None):
+        bids = misc.read_grid(f'{self.auct_dir}bids.txt', float, self.log.echo)
         misc.extend_array(bids, len(self.units), [0] * len(self.players))
         self.bid_sums = [0] * len(self.players)
+        self.array_engine = None
 
-        for unit, bid_row in zip(self.units, bids):
+        for u, (unit, bid_row) in enumerate(zip(self.units, bids)):
+            if previous is not None and previous[u][:len(bid_row)] == bid_row:
+                bid_row = list(previous[u])
             # if fewer than max players, create dummy players from existing bids
             while len(bid_row) < len(self.players):
                 bid_row.append(statistics.median(bid_row) * random.triangular(.8, 1.2))
@@ -349,52 +769,101 @@ class AuctionState:
                 self.bid_sums[i] += bid
             unit.bids = bid_row
 
+    # reread_players: indices of the players whose synergy files to read again, None for all.
+    # Players without a file get medians over the players before them, so theirs are always recomputed
+    def parse_synergies(self, reread_players: List[int] = None):
+        if reread_players is None:
+            self.declared_synergies = [None] * len(self.players)
         self.synergies = []
-        for player in self.players:
-            try:
-                next_synergies = misc.read_grid(f'{self.auct_dir}synergy_{player}.txt', float)
-            except FileNotFoundError:
+        self.synergy_adjacency = None
+        self.array_engine = None
+        for p, player in enumerate(self.players):
+            if reread_players is None or p in reread_players:
+                try:
+                    next_synergies = misc.read_grid(f'{self.auct_dir}synergy_{player}.txt', float, self.log.echo)
+                except FileNotFoundError:
+                    self.declared_synergies[p] = None
+                else:
+                    self.declared_synergies[p] = {(u_i, u_j): synergy
+                                                  for u_i, row in enumerate(next_synergies[:len(self.units)])
+                                                  for u_j, synergy in enumerate(row[:len(self.units)]) if synergy != 0}
+            if self.declared_synergies[p] is None:
                 self.set_median_synergy()
             else:
-                misc.extend_array(next_synergies, len(self.units), [0] * len(self.units))
-                for row in next_synergies:
-                    misc.extend_array(row, len(self.units), 0)
-                self.synergies.append(next_synergies)
+                self.synergies.append(self.declared_synergies[p])
 
     def run(self):
-        self.load()
+        self.deadline = time.perf_counter() + self.time_budget if self.time_budget > 0 else 0
+        self.cut_short = False
+        self.last_checkpoint = time.perf_counter()
+        self.resume_position = {}
+        with self.stats.phase('load'):
+            self.load()
 
         if not os.path.exists(f'{self.auct_dir}output'):
             os.makedirs(f'{self.auct_dir}output')
 
-        self.format_bids()
-        self.write_logs('bids')
-
-        for i, player in enumerate(self.players):
-            self.format_synergy(i)
-            self.write_logs(f'synergy_{player}')
-
-        while len(self.units) % len(self.players) != 0:
-            self.remove_least_valued_unit()
-        self.write_logs('remove_units')
-
-        self.format_initial_assign()
-        self.write_logs('initial_assign')
-
-        while self.improve_allocation_swaps():
-            pass
-
-        rotations = misc.one_loop_permutations(len(self.players))
-        test_until = len(rotations)
-        while test_until >= 0:
-            test_until = self.improve_allocation_rotate(test_until, rotations)
-
+        resumed_phase = None
+        if self.resume and self.anneal_chains == 0:
+            resumed_phase = self.restore_checkpoint()
+            if resumed_phase is not None:
+                self.build_array_engine()
+
+        if resumed_phase is None:
+            with self.stats.phase('format_inputs'):
+                self.format_bids()
+                self.write_logs('bids')
+
+                for i, player in enumerate(self.players):
+                    self.format_synergy(i)
+                    self.write_logs(f'synergy_{player}')
+
+            with self.stats.phase('initial_assign'):
+                while len(self.units) % len(self.players) != 0:
+                    self.remove_least_valued_unit()
+                self.write_logs('remove_units')
+                self.build_array_engine()
+
+                self.format_initial_assign()
+                self.write_logs('initial_assign')
+
+        if self.anneal_chains > 0:
+            with self.stats.phase('annealing'):
+                self.improve_allocation_annealing()
+        else:
+            if resumed_phase != 'rotations':
+                self.checkpoint_phase = 'swaps'
+                with self.stats.phase('swaps'):
+                    self.swap_phase()
+            self.checkpoint_phase = 'rotations'
+            with self.stats.phase('rotations'):
+                self.rotation_phase()
+            self.checkpoint_phase = None
+
+        if self.use_exact_solver:
+            with self.stats.phase('exact'):
+                self.improve_allocation_exact()
+
+        if self.cut_short:
+            self.stats.counts['cut_short'] += 1
+            self.print_and_log(self.cut_short_note())
         self.write_logs('reassignments')
 
-        self.format_value_matrices()
-        self.write_logs('matrices')
-        self.format_teams()
-        self.write_logs('teams')
+        with self.stats.phase('reporting'):
+            self.evaluation = self.evaluate()
+            if self.cut_short:
+                self.print_and_log(self.cut_short_note())
+            self.format_value_matrices(self.evaluation)
+            self.write_logs('matrices')
+            if self.cut_short:
+                self.print_and_log(self.cut_short_note())
+            self.format_teams(self.evaluation)
+            self.write_logs('teams')
+            self.evaluation.export(f'{self.auct_dir}output/')
+
+        checkpoint.remove(self.log.directory)
+        if self.stats.enabled:
+            self.stats.write(f'{self.auct_dir}output/stats.json')
 
 
 if __name__ == '__main__':
@@ -1,8 +1,27 @@
 import AuctionState
+import Evaluation
+import portrait_atlas
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageDraw
+from typing import NamedTuple, Tuple
 # import cProfile
 
 
+class UnitSnapshot(NamedTuple):
+    name: str
+    owner: int
+    bids: Tuple[float, ...]
+
+
+# Everything the drawings read, fixed when taken so they can render concurrently while the state moves on.
+# units in recruit order, teams as in AuctionState.teams()
+class VisualsSnapshot(NamedTuple):
+    units: Tuple[UnitSnapshot, ...]
+    teams: Tuple[Tuple[UnitSnapshot, ...], ...]
+    handicaps: Tuple[float, ...]
+    cut_short: bool
+
+
 class AuctionStateVisuals(AuctionState.AuctionState):
     def __init__(self):
         super().__init__()
@@ -22,16 +41,16 @@ class AuctionStateVisuals(AuctionState.AuctionState):
         while len(self.colors) < len(self.players):
             self.colors.append(self.colors[len(self.colors) - 7])
 
+        # portraits may already be given, e.g. shared across a game's auctions by batch.py
+        if any(unit.name not in self.portraits for unit in self.units):
+            self.portraits = {**portrait_atlas.load(self.game_dir), **self.portraits}
         for unit in self.units:
-            filename = f'{self.game_dir}portraits/{unit.name}.png'
-            try:
-                self.portraits[unit.name] = Image.open(filename)
-                self.portrait_x = max(self.portrait_x, self.portraits[unit.name].size[0])
-                self.portrait_y = max(self.portrait_y, self.portraits[unit.name].size[1])
-            except FileNotFoundError as error:
-                print(error)
-                print(filename)
+            if unit.name not in self.portraits:
+                print(f'No portrait for {unit.name}')
+                print(f'{self.game_dir}portraits/{unit.name}.png')
                 self.portraits[unit.name] = Image.new('RGB', (self.portrait_x, self.portrait_y), (255,0,0))
+            self.portrait_x = max(self.portrait_x, self.portraits[unit.name].size[0])
+            self.portrait_y = max(self.portrait_y, self.portraits[unit.name].size[1])
 
         self.x_step = self.portrait_x + self.margin
         self.y_step = self.portrait_y + self.margin
@@ -42,49 +61,62 @@ class AuctionStateVisuals(AuctionState.AuctionState):
                 self.max_bid = max(unit.bids)
         self.bar_max_height = int(self.portrait_y * self.max_bid)
 
-    def paste_portrait(self, im, unit, coord):
+    # handicaps from evaluation if given, e.g. the one run() reported
+    def snapshot(self, evaluation: Evaluation.Evaluation = None) -> VisualsSnapshot:
+        evaluation = evaluation or self.evaluate()
+        units = tuple(UnitSnapshot(unit.name, unit.owner, tuple(unit.bids)) for unit in self.units)
+        teams = tuple(tuple(units[u] for u in team) for team in self.roster.team_index)
+        return VisualsSnapshot(units, teams, tuple(evaluation.handicaps), evaluation.cut_short)
+
+    def paste_portrait(self, im, drawer, unit: UnitSnapshot, coord):
         im.paste(self.portraits[unit.name], coord)
-        drawer = ImageDraw.Draw(im)
         drawer.text((coord[0] + self.margin, coord[1] + self.portrait_y + 5), unit.name, self.colors[unit.owner])
 
-    def draw_teams(self, back_color=(0,0,0)):
+    def draw_teams(self, back_color=(0,0,0), snapshot: VisualsSnapshot = None):
+        snapshot = snapshot or self.snapshot()
         x_step = self.x_step + self.margin  # increased x margin
 
+        note_height = self.margin if snapshot.cut_short else 0
         im = Image.new('RGB', (x_step * len(self.players) - 2 * self.margin,
-                               self.y_step * self.max_team_size + 2 * self.margin), back_color)
+                               self.y_step * self.max_team_size + 2 * self.margin + note_height), back_color)
         drawer = ImageDraw.Draw(im)
-
-        teams = self.teams()
-        handicaps = self.handicaps()
+        if snapshot.cut_short:
+            drawer.text((self.margin, self.y_step * self.max_team_size + 2 * self.margin),
+                        self.cut_short_note(), (255,255,255))
 
         for i in range(len(self.players)):
             col_start = i * x_step
             drawer.text((col_start + self.margin, 0), self.players[i], self.colors[i])
 
             for j in range(self.max_team_size):
-                self.paste_portrait(im, teams[i][j], (col_start, j * self.y_step + self.margin))
+                self.paste_portrait(im, drawer, snapshot.teams[i][j], (col_start, j * self.y_step + self.margin))
 
             drawer.text((col_start + self.margin, self.y_step * self.max_team_size + self.margin),
-                        f'{handicaps[i]:7.4}', self.colors[i])
+                        f'{snapshot.handicaps[i]:7.4}', self.colors[i])
 
         im.save(f'{self.auct_dir}output/teams.png')
 
     def y_at_bid(self, bid):
         return int(self.bar_max_height * (1 - bid/self.max_bid))
 
-    def draw_bids(self, back_color=(0,0,0)):
-        self.units.sort(key=lambda unit: -sum(unit.bids))
+    # highest total bid first. sorted is stable, so ties stay in recruit order
+    @staticmethod
+    def by_total_bid(snapshot: VisualsSnapshot) -> Tuple[UnitSnapshot, ...]:
+        return tuple(sorted(snapshot.units, key=lambda unit: -sum(unit.bids)))
 
-        im = Image.new('RGB', (self.x_step * len(self.units) - self.margin,
+    def draw_bids(self, back_color=(0,0,0), snapshot: VisualsSnapshot = None):
+        units = self.by_total_bid(snapshot or self.snapshot())
+
+        im = Image.new('RGB', (self.x_step * len(units) - self.margin,
                                self.y_step + self.bar_max_height), back_color)
         drawer = ImageDraw.Draw(im)
         for i in range(int(self.max_bid) + 1):
             drawer.line(((0, self.y_at_bid(i)), (im.size[0], self.y_at_bid(i))), (255,255,255))
 
-        for i, unit in enumerate(self.units):
+        for i, unit in enumerate(units):
             x_start = i * self.x_step
 
-            self.paste_portrait(im, unit, (x_start, self.bar_max_height))
+            self.paste_portrait(im, drawer, unit, (x_start, self.bar_max_height))
 
             for j in range(len(self.players)):
                 drawer.rectangle([(x_start + self.bar_width * j, self.y_at_bid(unit.bids[j])),
@@ -93,23 +125,21 @@ class AuctionStateVisuals(AuctionState.AuctionState):
 
         im.save(f'{self.auct_dir}output/bids.png')
 
-        self.units.sort(key=lambda unit: unit.recruit_order)
-
     # if next unit's bars can fit beneath bottom-left most portrait, start a new row
-    def draw_bids_compact(self, back_color=(0,0,0)):
-        self.units.sort(key=lambda unit: -sum(unit.bids))
+    def draw_bids_compact(self, back_color=(0,0,0), snapshot: VisualsSnapshot = None):
+        units = self.by_total_bid(snapshot or self.snapshot())
 
         # highest bar must fit under min_clearance_pixel to be eligible
-        min_clearance_pixel = [-1] * len(self.units)
+        min_clearance_pixel = [-1] * len(units)
         columns_used = 0
 
-        im = Image.new('RGB', (self.x_step * len(self.units) - self.margin,
+        im = Image.new('RGB', (self.x_step * len(units) - self.margin,
                                self.y_step + self.bar_max_height), back_color)
         drawer = ImageDraw.Draw(im)
         for i in range(int(self.max_bid) + 1):
             drawer.line(((0, self.y_at_bid(i)), (im.size[0], self.y_at_bid(i))), (255,255,255))
 
-        for i, unit in enumerate(self.units):
+        for i, unit in enumerate(units):
             bar_heights = [self.y_at_bid(unit.bids[j]) for j in range(len(self.players))]
             highest_bar = min(bar_heights)
             lowest_bar = max(bar_heights)
@@ -123,7 +153,7 @@ class AuctionStateVisuals(AuctionState.AuctionState):
                         columns_used = j + 1
                     break
 
-            self.paste_portrait(im, unit, (x_start, lowest_bar))
+            self.paste_portrait(im, drawer, unit, (x_start, lowest_bar))
 
             for j in range(len(self.players)):
                 drawer.rectangle([(x_start + self.bar_width * j, bar_heights[j]),
@@ -133,13 +163,18 @@ class AuctionStateVisuals(AuctionState.AuctionState):
         im = im.crop((0, 0, self.x_step * columns_used - self.margin, self.y_step + self.bar_max_height))
         im.save(f'{self.auct_dir}output/bids_compact.png')
 
-        self.units.sort(key=lambda unit: unit.recruit_order)
+    # all three images from one snapshot, a thread each. PIL releases the GIL while pasting and encoding
+    def draw_all(self, back_color=(0,0,0), evaluation: Evaluation.Evaluation = None):
+        snapshot = self.snapshot(evaluation)
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(draw, back_color, snapshot)
+                       for draw in (self.draw_teams, self.draw_bids, self.draw_bids_compact)]
+            for future in futures:
+                future.result()
 
 
 if __name__ == '__main__':
     test = AuctionStateVisuals()
     # cProfile.run('test.run()', sort='cumulative')
     test.run()
-    test.draw_teams()
-    test.draw_bids()
-    test.draw_bids_compact()
+    test.draw_all(evaluation=test.evaluation)
@@ -0,0 +1,77 @@
+import csv
+import json
+import pricing
+from typing import Dict, List, NamedTuple, Tuple
+
+Matrix = List[List[float]]
+# matrix layers in reporting order, each built from the one before
+LAYERS = ('value', 'synergy', 'synergy_adjusted', 'redundancy_adjusted')
+
+
+# Everything reported about one allocation, computed once by AuctionState.evaluate().
+# The text logs, the images and the JSON/CSV exports all read from it.
+# matrices[layer][valuer][team], comp_sats[layer][valuer], with a 'handicap_adjusted' layer of comp_sats too.
+# teams are unit names in recruit order
+class Evaluation(NamedTuple):
+    players: Tuple[str, ...]
+    teams: Tuple[Tuple[str, ...], ...]
+    owners: Tuple[int, ...]
+    matrices: Dict[str, Matrix]
+    comp_sats: Dict[str, List[float]]
+    robustness: float
+    handicaps: List[float]
+    score: float
+    cut_short: bool
+
+    @staticmethod
+    def from_matrices(players: List[str], teams: List[List[str]], owners: List[int], value_matrix: Matrix,
+                      synergy_matrix: Matrix, v_s_matrix: Matrix, final_matrix: Matrix,
+                      robust_factor: float, cut_short: bool) -> 'Evaluation':
+        matrices = dict(zip(LAYERS, (value_matrix, synergy_matrix, v_s_matrix, final_matrix)))
+        comp_sats = {layer: [pricing.comp_sat(row, p) for p, row in enumerate(matrix)]
+                     for layer, matrix in matrices.items()}
+        handicaps = pricing.pareto_prices(final_matrix)
+        comp_sats['handicap_adjusted'] = [sat - pricing.comp_sat(handicaps, p)
+                                          for p, sat in enumerate(comp_sats['redundancy_adjusted'])]
+        robustness = sum(row[p] for p, row in enumerate(final_matrix)) / len(players)
+        return Evaluation(tuple(players), tuple(tuple(team) for team in teams), tuple(owners), matrices, comp_sats,
+                          robustness, handicaps, pricing.allocation_score(final_matrix, robust_factor), cut_short)
+
+    def handicap_adjusted_matrix(self) -> Matrix:
+        return [[value - price for value, price in zip(row, self.handicaps)]
+                for row in self.matrices['redundancy_adjusted']]
+
+    def as_dict(self) -> dict:
+        return {'players': list(self.players), 'teams': [list(team) for team in self.teams],
+                'owners': list(self.owners), 'handicaps': self.handicaps, 'score': self.score,
+                'average_robustness': self.robustness, 'cut_short': self.cut_short,
+                'matrices': dict(self.matrices, handicap_adjusted=self.handicap_adjusted_matrix()),
+                'comp_sats': self.comp_sats}
+
+    def write_json(self, filename: str):
+        with open(filename, 'w') as file:
+            json.dump(self.as_dict(), file, indent=1)
+
+    # one row per layer and valuer: layer, valuer, that valuer's value of each team, their comp_sat
+    def write_matrices_csv(self, filename: str):
+        matrices = dict(self.matrices, handicap_adjusted=self.handicap_adjusted_matrix())
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['layer', 'valuer'] + list(self.players) + ['comp_sat'])
+            for layer, matrix in matrices.items():
+                for player, row, sat in zip(self.players, matrix, self.comp_sats[layer]):
+                    writer.writerow([layer, player] + row + [sat])
+
+    # one row per player: player, handicap, then their team's units
+    def write_teams_csv(self, filename: str):
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['player', 'handicap'] + [f'unit{i}' for i in range(max(map(len, self.teams), default=0))])
+            for player, handicap, team in zip(self.players, self.handicaps, self.teams):
+                writer.writerow([player, handicap] + list(team))
+
+    # evaluation.json, matrices.csv and teams.csv in directory
+    def export(self, directory: str):
+        self.write_json(f'{directory}evaluation.json')
+        self.write_matrices_csv(f'{directory}matrices.csv')
+        self.write_teams_csv(f'{directory}teams.csv')
@@ -0,0 +1,260 @@
+import IncrementalScore
+import heapq
+import itertools
+import pricing
+import time
+from typing import List, Tuple
+
+
+# Branch and bound over owner assignments. Units are placed one at a time, most valued first.
+# allocation_score is a sum of team columns (see IncrementalScore). Once placed, a unit is worth at most its bid
+# plus all its positive synergies and at least its bid plus all its negative synergies, which bounds the value
+# every player can end up seeing in each team, and so the score of any completion of a partial assignment.
+# Stops at the node or time budget with the best allocation found and a proven upper bound on the optimum.
+# Best first: the open node with the highest bound is expanded next, diving from it through its best children
+# (the rest wait on the heap) down to a leaf for incumbents. Every open node is on the heap, so the upper bound
+# is the highest bound there, and it tightens as the shallow, loose nodes are expanded first.
+class ExactSolver:
+    def __init__(self, scorer: IncrementalScore.IncrementalScore, max_team_size: int,
+                 node_budget: int = 0, time_budget: float = 0):
+        self.scorer = scorer
+        self.max_team_size = max_team_size
+        self.node_budget = node_budget  # 0 for no limit
+        self.time_budget = time_budget  # seconds, 0 for no limit
+        self.num_players = scorer.num_players
+        self.num_units = len(scorer.bids)
+
+        # each unit's highest and lowest possible value to each player once placed on a team
+        self.high = [[0] * self.num_units for _ in range(self.num_players)]
+        self.low = [[0] * self.num_units for _ in range(self.num_players)]
+        for u, bids in enumerate(scorer.bids):
+            for player in range(self.num_players):
+                self.high[player][u] = bids[player] + sum(max(0, s) for _, s in scorer.links[player][u])
+                self.low[player][u] = bids[player] + sum(min(0, s) for _, s in scorer.links[player][u])
+        self.high_order = [sorted(range(self.num_units), key=lambda u: -high[u]) for high in self.high]
+        self.low_order = [sorted(range(self.num_units), key=lambda u: low[u]) for low in self.low]
+        self.unit_order = sorted(range(self.num_units), key=lambda u: -sum(scorer.bids[u]))
+
+        # incumbent, seeded from the scorer's allocation
+        self.best_owners = list(scorer.owners)
+        self.best_score = scorer.score
+
+        self.owners = [-1] * self.num_units
+        self.team_sizes = [0] * self.num_players
+        self.columns = [[0] * self.num_players for _ in range(self.num_players)]
+        self.nodes = 0
+        self.deadline = 0
+        self.open_bounds = []  # bounds of subtrees left unexplored when a budget ran out
+        self.path = []  # team of each placed unit, in unit_order
+        self.upper_bound = 0
+        self.proven = False
+        self.price_steps = 8
+
+    @property
+    def gap(self) -> float:
+        return max(0.0, self.upper_bound - self.best_score)
+
+    # sum of the k best (or worst) values of unassigned units, for k = 0 ~ max_team_size
+    def prefix_sums(self, values: List[float], order: List[int]) -> List[float]:
+        sums = [0]
+        for u in order:
+            if len(sums) > self.max_team_size:
+                break
+            if self.owners[u] < 0:
+                sums.append(sums[-1] + values[u])
+        return sums
+
+    def bound(self) -> float:
+        highs = [self.prefix_sums(self.high[player], self.high_order[player]) for player in range(self.num_players)]
+        lows = [self.prefix_sums(self.low[player], self.low_order[player]) for player in range(self.num_players)]
+        own_factor = 1 + self.scorer.robust_factor
+        opp_factor = 1 / (self.num_players - 1)
+
+        # each team on its own: owner gets its best remaining units, everyone else sees the worst
+        column_bound = 0
+        for j, column in enumerate(self.columns):
+            slots = self.max_team_size - self.team_sizes[j]
+            optimistic = [value + (highs[i][slots] if i == j else lows[i][slots]) for i, value in enumerate(column)]
+            column_bound += self.scorer.column_score(j, optimistic)
+
+        # Linear over the range each value can still reach: above the owner's redundancy curve (concave),
+        # below everyone else's (chord). Each remaining unit then adds a fixed value to whichever team it joins,
+        # and only one team
+        linear_bound = 0
+        unit_weights = []
+        for j, column in enumerate(self.columns):
+            slots = self.max_team_size - self.team_sizes[j]
+            weights = [0] * self.num_players
+            for i, value in enumerate(column):
+                if i == j:
+                    offset, slope = self.line_above(i, value + lows[i][slots], value + highs[i][slots])
+                    linear_bound += own_factor * (offset + slope * value)
+                    weights[i] = own_factor * slope
+                else:
+                    offset, slope = self.line_below(i, value + lows[i][slots], value + highs[i][slots])
+                    linear_bound -= opp_factor * (offset + slope * value)
+                    weights[i] = -opp_factor * slope
+            if slots > 0:
+                unit_weights.append((j, weights))
+        unit_values = [[sum(weight * (self.high[i][u] if i == j else self.low[i][u])
+                            for i, weight in enumerate(weights))
+                        for j, weights in unit_weights]
+                       for u in range(self.num_units) if self.owners[u] < 0]
+        linear_bound += self.assignment_bound(unit_values, [self.max_team_size - self.team_sizes[j]
+                                                            for j, _ in unit_weights])
+
+        return min(column_bound, linear_bound)
+
+    # Upper bound on assigning units to teams with these values and free slots, by Lagrangian relaxation:
+    # for any team prices, each unit takes its best value net of price, plus the prices of all slots.
+    # A few subgradient steps move prices towards overfull teams
+    def assignment_bound(self, unit_values: List[List[float]], slots: List[int]) -> float:
+        if not unit_values:
+            return 0
+        prices = [0] * len(slots)
+        step = max(max(values) - min(values) for values in unit_values) / 2
+        bound = float('inf')
+        for _ in range(self.price_steps):
+            counts = [0] * len(slots)
+            total = sum(price * slot for price, slot in zip(prices, slots))
+            for values in unit_values:
+                net = [value - price for value, price in zip(values, prices)]
+                best = max(net)
+                total += best
+                counts[net.index(best)] += 1
+            bound = min(bound, total)
+            if counts == slots or step <= 0:
+                break
+            prices = [price + step * (count - slot) / len(unit_values)
+                      for price, count, slot in zip(prices, counts, slots)]
+            step /= 2
+        return bound
+
+    def redundancy(self, player: int, value: float) -> float:
+        return pricing.redundancy(max(0.0, value), self.scorer.bid_sums[player], self.scorer.opp_ratio)
+
+    # (offset, slope) of a line above player's redundancy curve between low and high
+    def line_above(self, player: int, low: float, high: float) -> Tuple[float, float]:
+        max_v = self.scorer.bid_sums[player]
+        if max_v <= 0 or high <= 0:
+            return 0, 0
+        # tangent in the middle of the range, the curve is concave above 0
+        point = (max(0.0, low) + high) / 2
+        slope = max_v**2 * self.scorer.opp_ratio / (point + max_v * self.scorer.opp_ratio)**2
+        offset = self.redundancy(player, point) - slope * point
+        if low < 0 and offset + slope * low < 0:  # the curve is flat below 0, use its steepest slope from low
+            slope = 1 / self.scorer.opp_ratio
+            offset = -slope * low
+        return offset, slope
+
+    # (offset, slope) of a line below player's redundancy curve between low and high
+    def line_below(self, player: int, low: float, high: float) -> Tuple[float, float]:
+        if high <= 0:
+            return 0, 0
+        if low < 0:  # from the origin, the curve is flat below 0
+            return 0, self.redundancy(player, high) / high
+        if high == low:
+            return self.redundancy(player, low), 0
+        slope = (self.redundancy(player, high) - self.redundancy(player, low)) / (high - low)
+        return self.redundancy(player, low) - slope * low, slope
+
+    # synergy of u with the units currently placed on team j
+    def synergy_with(self, u: int, j: int) -> List[float]:
+        synergies = [0] * self.num_players
+        for player, links in enumerate(self.scorer.links):
+            for mate, synergy in links[u]:
+                if self.owners[mate] == j:
+                    synergies[player] += synergy
+        return synergies
+
+    def place(self, u: int, j: int):
+        column = self.columns[j]
+        for player, synergy in enumerate(self.synergy_with(u, j)):
+            column[player] += self.scorer.bids[u][player] + synergy
+        self.team_sizes[j] += 1
+        self.owners[u] = j
+
+    def unplace(self, u: int, j: int):
+        self.owners[u] = -1
+        column = self.columns[j]
+        for player, synergy in enumerate(self.synergy_with(u, j)):
+            column[player] -= self.scorer.bids[u][player] + synergy
+        self.team_sizes[j] -= 1
+
+    def out_of_budget(self) -> bool:
+        return ((0 < self.node_budget <= self.nodes) or
+                (self.time_budget > 0 and time.perf_counter() > self.deadline))
+
+    # place the units of path, a list of teams in unit_order, keeping whatever prefix is already placed
+    def move_to(self, path: List[int]):
+        common = 0
+        while common < min(len(path), len(self.path)) and path[common] == self.path[common]:
+            common += 1
+        while len(self.path) > common:
+            self.unplace(self.unit_order[len(self.path) - 1], self.path.pop())
+        for j in path[common:]:
+            self.place(self.unit_order[len(self.path)], j)
+            self.path.append(j)
+
+    # children of the placed path that can still improve, as (bound, team), best first
+    def children(self) -> List[Tuple[float, int]]:
+        u = self.unit_order[len(self.path)]
+        children = []
+        for j in range(self.num_players):
+            if self.team_sizes[j] < self.max_team_size:
+                self.place(u, j)
+                bound = self.bound()
+                self.unplace(u, j)
+                if bound > self.best_score + IncrementalScore.MIN_GAIN:
+                    children.append((bound, j))
+        children.sort(reverse=True)
+        return children
+
+    # False if a budget ran out, leaving the bounds of every open node in open_bounds.
+    # Heap entries are (-bound, tiebreak, path), path a linked (parent path, team) pair, None for the root
+    def search(self) -> bool:
+        tiebreak = itertools.count()
+        heap = [(-self.bound(), next(tiebreak), None)]
+        while heap:
+            if -heap[0][0] <= self.best_score + IncrementalScore.MIN_GAIN:
+                return True  # no open node can improve
+            if self.out_of_budget():
+                self.open_bounds = [-neg_bound for neg_bound, _, _ in heap]
+                return False
+            neg_bound, _, linked_path = heapq.heappop(heap)
+            path = []
+            link = linked_path
+            while link is not None:
+                link, j = link
+                path.append(j)
+            path.reverse()
+            self.move_to(path)
+
+            # dive through the best children, the other children wait on the heap
+            bound = -neg_bound
+            while True:
+                self.nodes += 1
+                if len(self.path) >= self.num_units:
+                    score = sum(self.scorer.column_score(j, column) for j, column in enumerate(self.columns))
+                    if score > self.best_score + IncrementalScore.MIN_GAIN:
+                        self.best_score = score
+                        self.best_owners = list(self.owners)
+                    break
+                if self.out_of_budget():  # back on the heap so the frontier stays complete
+                    heapq.heappush(heap, (-bound, next(tiebreak), linked_path))
+                    break
+                children = self.children()
+                if not children:
+                    break
+                for child_bound, j in children[1:]:
+                    heapq.heappush(heap, (-child_bound, next(tiebreak), (linked_path, j)))
+                bound, j = children[0]
+                self.place(self.unit_order[len(self.path)], j)
+                self.path.append(j)
+                linked_path = (linked_path, j)
+        return True
+
+    def solve(self):
+        self.deadline = time.perf_counter() + self.time_budget
+        self.proven = self.search()
+        self.upper_bound = max([self.best_score] + self.open_bounds)
@@ -0,0 +1,267 @@
+import pricing
+import heapq
+import time
+from typing import List, Optional, Tuple
+
+# Gains at or below this are float noise from accumulating columns, not improvements
+MIN_GAIN = 1e-9
+
+
+# allocation_score is a sum over columns: column j holds every player's (unadjusted, synergy included)
+# value of team j, and only team j's units affect it. Keep the columns and their score contributions,
+# so a reassignment only recomputes the columns of the teams it touches.
+class IncrementalScore:
+    def __init__(self, state):
+        self.bids = state.roster.bid_rows()
+        self.links = state.synergy_links()
+        self.bid_sums = state.bid_sums
+        self.robust_factor = state.robust_factor
+        self.num_players = len(state.players)
+        self.opp_ratio = 1-1/self.num_players
+
+        self.set_owners(state.owners())
+
+    def set_owners(self, owners: List[int]):
+        self.owners = list(owners)
+        self.teams = [[] for _ in range(self.num_players)]  # unit indices, any order
+        for u, owner in enumerate(self.owners):
+            self.teams[owner].append(u)
+
+        self.columns = [self.team_column(team) for team in self.teams]
+        self.column_scores = [self.column_score(j, column) for j, column in enumerate(self.columns)]
+        self.score = sum(self.column_scores)
+
+    # each player's synergy between unit u and the members of team j, skipping unit skip
+    def team_synergy(self, u: int, j: int, skip: int = -1) -> List[float]:
+        synergies = [0] * self.num_players
+        for player, links in enumerate(self.links):
+            for mate, synergy in links[u]:
+                if self.owners[mate] == j and mate != skip:
+                    synergies[player] += synergy
+        return synergies
+
+    def team_column(self, team: List[int]) -> List[float]:
+        column = [0] * self.num_players
+        for u in team:
+            for player in range(self.num_players):
+                column[player] += self.bids[u][player]
+        for player, links in enumerate(self.links):
+            for u in team:
+                for mate, synergy in links[u]:
+                    if u < mate and self.owners[mate] == self.owners[u]:
+                        column[player] += synergy
+        return column
+
+    # this team's share of pricing.allocation_score
+    def column_score(self, j: int, column: List[float]) -> float:
+        score = 0
+        for i, value in enumerate(column):
+            value = pricing.redundancy(max(0.0, value), self.bid_sums[i], self.opp_ratio)
+            if i == j:
+                score += value * (1 + self.robust_factor)
+            else:
+                score -= value / (self.num_players - 1)
+        return score
+
+    # column of team j after out_u leaves and in_u joins
+    def replaced_column(self, j: int, out_u: int, in_u: int) -> List[float]:
+        return [value + in_bid - out_bid + in_synergy - out_synergy
+                for value, in_bid, out_bid, in_synergy, out_synergy in
+                zip(self.columns[j], self.bids[in_u], self.bids[out_u],
+                    self.team_synergy(in_u, j, out_u), self.team_synergy(out_u, j))]
+
+    # change in team j's column score if out_u leaves and in_u joins
+    def replace_gain(self, j: int, out_u: int, in_u: int) -> float:
+        return self.column_score(j, self.replaced_column(j, out_u, in_u)) - self.column_scores[j]
+
+    def swap_gain(self, u_i: int, u_j: int) -> float:
+        team_i = self.owners[u_i]
+        team_j = self.owners[u_j]
+        return (self.column_score(team_i, self.replaced_column(team_i, u_i, u_j)) - self.column_scores[team_i] +
+                self.column_score(team_j, self.replaced_column(team_j, u_j, u_i)) - self.column_scores[team_j])
+
+    def replace(self, j: int, out_u: int, in_u: int, column: List[float]):
+        self.columns[j] = column
+        self.column_scores[j] = self.column_score(j, column)
+        self.teams[j][self.teams[j].index(out_u)] = in_u
+        self.owners[in_u] = j
+
+    def swap(self, u_i: int, u_j: int):
+        team_i = self.owners[u_i]
+        team_j = self.owners[u_j]
+        column_i = self.replaced_column(team_i, u_i, u_j)
+        column_j = self.replaced_column(team_j, u_j, u_i)
+        self.replace(team_i, u_i, u_j, column_i)
+        self.replace(team_j, u_j, u_i, column_j)
+        self.score = sum(self.column_scores)
+
+    # changes of a loop of units, each unit moving to the team of the next, the last to the team of the first.
+    # list of (team, unit leaving, unit joining, new column)
+    def loop_changes(self, units: List[int]) -> List[Tuple[int, int, int, List[float]]]:
+        changes = []
+        for k, out_u in enumerate(units):
+            in_u = units[k-1]
+            team = self.owners[out_u]
+            changes.append((team, out_u, in_u, self.replaced_column(team, out_u, in_u)))
+        return changes
+
+    def loop_gain(self, changes: List[Tuple[int, int, int, List[float]]]) -> float:
+        return sum(self.column_score(team, column) - self.column_scores[team] for team, _, _, column in changes)
+
+    def apply_loop(self, changes: List[Tuple[int, int, int, List[float]]]):
+        for team, out_u, in_u, column in changes:
+            self.replace(team, out_u, in_u, column)
+        self.score = sum(self.column_scores)
+
+    # best improving choice of traded units for one rotation, trying units in recruit order.
+    # returns (gain, outgoing), gain 0 if nothing improves.
+    # Past deadline (time.time(), 0 for none) returns the best found so far
+    def best_rotation(self, rotation: Tuple[int], deadline: float = 0) -> Tuple[float, List[int]]:
+        trading_players = [p for p, r in enumerate(rotation) if p != r]
+        teams = [sorted(team) for team in self.teams]
+        bounds = RotationBounds(self, rotation, teams)
+        outgoing = [-1] * self.num_players
+        best = (0, [])
+
+        def recursive_rotate(t_i):
+            nonlocal best
+            if t_i >= len(trading_players):
+                best = (bounds.bound(outgoing), list(outgoing))
+                return
+            for u in teams[trading_players[t_i]]:
+                if deadline and time.time() > deadline:
+                    break
+                outgoing[trading_players[t_i]] = u
+                if bounds.bound(outgoing) > max(best[0], MIN_GAIN):
+                    recursive_rotate(t_i + 1)
+            outgoing[trading_players[t_i]] = -1
+
+        recursive_rotate(0)
+        return best
+
+
+# A rotation's gain is a sum over receiving players, each term depending only on the unit the receiver gives
+# and the unit it receives. Tabulate every such term so a partial choice of traded units can be bounded:
+# exact terms where both units are chosen, the best term over the unchosen side otherwise.
+class RotationBounds:
+    def __init__(self, scorer: IncrementalScore, rotation: Tuple[int], teams: List[List[int]]):
+        self.trades = [(giver, receiver) for giver, receiver in enumerate(rotation) if giver != receiver]
+        # gains[receiver][out_u][in_u]
+        self.gains = {}
+        self.best_given_out = {}
+        self.best_given_in = {}
+        self.best = {}
+        for giver, receiver in self.trades:
+            gains = {}
+            for out_u in teams[receiver]:
+                gains[out_u] = {in_u: scorer.replace_gain(receiver, out_u, in_u) for in_u in teams[giver]}
+            self.gains[receiver] = gains
+            self.best_given_out[receiver] = {out_u: max(row.values()) for out_u, row in gains.items()}
+            self.best_given_in[receiver] = {in_u: max(row[in_u] for row in gains.values()) for in_u in teams[giver]}
+            self.best[receiver] = max(self.best_given_out[receiver].values())
+
+    # optimistic gain given outgoing[p], the unit each trading player p gives away, -1 if not chosen yet.
+    # Exact once every unit is chosen
+    def bound(self, outgoing: List[int]) -> float:
+        bound = 0
+        for giver, receiver in self.trades:
+            out_u = outgoing[receiver]
+            in_u = outgoing[giver]
+            if out_u >= 0 and in_u >= 0:
+                bound += self.gains[receiver][out_u][in_u]
+            elif out_u >= 0:
+                bound += self.best_given_out[receiver][out_u]
+            elif in_u >= 0:
+                bound += self.best_given_in[receiver][in_u]
+            else:
+                bound += self.best[receiver]
+        return bound
+
+
+# Best-improvement swaps: the gain of every improving cross-team pair waits in a max-heap.
+# A swap's gain is the sum of one replace_gain term per team, and a term for team j only depends on
+# team j's members besides the two units. So a swap between teams A and B only invalidates the terms of A and B,
+# every other team's terms are reused. Heap entries are stamped with the versions of both teams
+# when scored, and dropped as stale when popped if either team has changed since
+class SwapQueue:
+    def __init__(self, scorer: IncrementalScore):
+        self.scorer = scorer
+        # versions come from one counter, so an entry can never match a different team's version
+        self.versions = list(range(scorer.num_players))
+        self.last_version = scorer.num_players - 1
+        # terms[j][(out_u, in_u)], every unit on team j against every unit off it
+        self.terms = [{} for _ in range(scorer.num_players)]
+        self.evaluations = 0
+        for j in range(scorer.num_players):
+            self.score_terms(j)
+
+        self.heap = []
+        for u_i in range(len(scorer.owners)):
+            for u_j in range(u_i+1, len(scorer.owners)):
+                self.push(u_i, u_j)
+
+    def score_terms(self, j: int):
+        team = self.scorer.teams[j]
+        others = [u for u, owner in enumerate(self.scorer.owners) if owner != j]
+        self.terms[j] = {(out_u, in_u): self.scorer.replace_gain(j, out_u, in_u) for out_u in team for in_u in others}
+        self.evaluations += len(team) * len(others)
+
+    def push(self, u_i: int, u_j: int):
+        team_i = self.scorer.owners[u_i]
+        team_j = self.scorer.owners[u_j]
+        if team_i == team_j:
+            return
+        gain = self.terms[team_i][u_i, u_j] + self.terms[team_j][u_j, u_i]
+        if gain > MIN_GAIN:
+            heapq.heappush(self.heap, (-gain, u_i, u_j, self.versions[team_i], self.versions[team_j]))
+
+    # (gain, u_i, u_j) of the best current improving swap, ties to the earliest pair. None at a fixed point
+    def pop(self) -> Optional[Tuple[float, int, int]]:
+        while self.heap:
+            neg_gain, u_i, u_j, version_i, version_j = heapq.heappop(self.heap)
+            if (self.versions[self.scorer.owners[u_i]] == version_i and
+                    self.versions[self.scorer.owners[u_j]] == version_j):
+                return -neg_gain, u_i, u_j
+        return None
+
+    def swap(self, u_i: int, u_j: int):
+        team_i = self.scorer.owners[u_i]
+        team_j = self.scorer.owners[u_j]
+        self.scorer.swap(u_i, u_j)
+        for team in (team_i, team_j):
+            self.last_version += 1
+            self.versions[team] = self.last_version
+            self.score_terms(team)
+
+        for u in self.scorer.teams[team_i]:
+            for other in range(len(self.scorer.owners)):
+                self.push(min(u, other), max(u, other))
+        for u in self.scorer.teams[team_j]:
+            for other in range(len(self.scorer.owners)):
+                if self.scorer.owners[other] != team_i:
+                    self.push(min(u, other), max(u, other))
+
+
+# Process pool workers for AuctionState.improve_allocation_rotate_parallel and improve_allocation_annealing.
+# The scorer holding bids and synergies is sent once per worker, each task only sends owners
+worker_scorer = None
+
+
+def init_worker(scorer: IncrementalScore):
+    global worker_scorer
+    worker_scorer = scorer
+
+
+# best improving (gain, rotation index, outgoing) among the indexed rotations, gain 0 if none improve.
+# deadline is a time.time() so it means the same in every process, 0 for none
+def best_rotation_of(owners: List[int], indexed_rotations: List[Tuple[int, Tuple[int]]],
+                     deadline: float = 0) -> Tuple[float, int, List[int]]:
+    worker_scorer.set_owners(owners)
+    best = (0, -1, [])
+    for r_i, rotation in indexed_rotations:
+        if deadline and time.time() > deadline:
+            break
+        gain, outgoing = worker_scorer.best_rotation(rotation, deadline)
+        if gain > best[0]:
+            best = (gain, r_i, outgoing)
+    return best
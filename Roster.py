@@ -0,0 +1,87 @@
+from array import array
+from bisect import insort
+from typing import List
+
+
+# Struct of arrays for the units of an auction: bids in one contiguous U x P array of doubles (row u is unit u),
+# owners in an int array, and each team's unit indices kept sorted by recruit order as owners change,
+# so teams never need rebuilding from a scan of every unit.
+# Unassigned units (-1) are indexed under the last team, as the old full scan did.
+class Roster:
+    def __init__(self, names: List[str], num_players: int):
+        self.names = list(names)
+        self.num_players = num_players
+        self.bids = array('d', bytes(8 * len(self.names) * num_players))
+        self.owners = array('i', [-1]) * len(self.names)
+        self.team_index = [[] for _ in range(num_players)]
+        if num_players > 0:
+            self.team_index[-1] = list(range(len(self.names)))
+        self.units = [Unit(self, u) for u in range(len(self.names))]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def row(self, u: int) -> memoryview:
+        return memoryview(self.bids)[u * self.num_players:(u + 1) * self.num_players]
+
+    def set_bids(self, u: int, bids: List[float]):
+        self.bids[u * self.num_players:(u + 1) * self.num_players] = array('d', bids)
+
+    # plain lists for scorers that index bids in their inner loops or are sent to worker processes
+    def bid_rows(self) -> List[List[float]]:
+        return [self.bids[u * self.num_players:(u + 1) * self.num_players].tolist() for u in range(len(self))]
+
+    def set_owner(self, u: int, owner: int):
+        old_team = self.team_index[self.owners[u]]
+        new_team = self.team_index[owner]
+        self.owners[u] = owner
+        if old_team is not new_team:
+            old_team.remove(u)
+            insort(new_team, u)
+
+    def teams(self) -> List[List['Unit']]:
+        return [[self.units[u] for u in team] for team in self.team_index]
+
+    # Drops unit u, later units move up one recruit order.
+    # Arrays are rebuilt rather than resized in place, so row views handed out earlier never block this
+    def remove(self, u: int):
+        start, end = u * self.num_players, (u + 1) * self.num_players
+        self.bids = self.bids[:start] + self.bids[end:]
+        self.owners = self.owners[:u] + self.owners[u+1:]
+        self.names.pop(u)
+        self.units.pop(u)
+        for unit in self.units[u:]:
+            unit.recruit_order -= 1
+
+        self.team_index = [[] for _ in range(self.num_players)]
+        for u, owner in enumerate(self.owners):
+            self.team_index[owner].append(u)
+
+
+# View of one roster row, unit.recruit_order is the row
+class Unit:
+    __slots__ = ('roster', 'recruit_order')
+
+    def __init__(self, roster: Roster, recruit_order: int):
+        self.roster = roster
+        self.recruit_order = recruit_order
+
+    @property
+    def name(self) -> str:
+        return self.roster.names[self.recruit_order]
+
+    @property
+    def owner(self) -> int:
+        return self.roster.owners[self.recruit_order]
+
+    @owner.setter
+    def owner(self, owner: int):
+        self.roster.set_owner(self.recruit_order, owner)
+
+    @property
+    def bids(self) -> memoryview:
+        return self.roster.row(self.recruit_order)
+
+    @bids.setter
+    def bids(self, bids: List[float]):
+        self.roster.set_bids(self.recruit_order, bids)
@@ -0,0 +1,114 @@
+import heapq
+from typing import Iterator, List, Tuple
+
+
+# Order for the serial rotation search, learned from the gains rotations have found so far.
+# Each rotation and each set of trading players keeps its tries, improvements and summed gain.
+# The next rotation is the unverified one with the highest expected gain per try, then the best hit rate,
+# then the fewest trading players (cheapest to search), then lexicographic order.
+# A rotation is verified once it fails to improve, and any improvement unverifies every rotation,
+# so iteration ends after a full lap without improvement, as with the fixed order.
+#
+# The set terms are shared by every rotation of a set, so within a set the order only depends on the rotation terms.
+# Each set keeps a heap of its unverified rotations by those, and one heap across sets holds each set's best.
+# Recording a rotation re-pushes it and its set's best, O(log R) instead of rescanning every rotation.
+# Heap entries are dropped lazily once their stamp is out of date
+class RotationSchedule:
+    def __init__(self, rotations: List[Tuple[int]]):
+        trading_sets = [frozenset(p for p, r in enumerate(rotation) if p != r) for rotation in rotations]
+        set_indices = {}
+        self.set_of = [set_indices.setdefault(trading_set, len(set_indices)) for trading_set in trading_sets]
+        self.set_sizes = [0] * len(set_indices)
+        for trading_set, s_i in set_indices.items():
+            self.set_sizes[s_i] = len(trading_set)
+
+        self.tries = [0] * len(rotations)
+        self.improvements = [0] * len(rotations)
+        self.gains = [0.0] * len(rotations)
+        self.set_tries = [0] * len(set_indices)
+        self.set_improvements = [0] * len(set_indices)
+        self.set_gains = [0.0] * len(set_indices)
+
+        # a rotation is verified while its verified_lap is the current lap, improvements start a new lap
+        self.lap = 0
+        self.verified_lap = [-1] * len(rotations)
+        self.verified_this_lap = []
+
+        self.stamps = [0] * len(rotations)
+        self.set_heaps = [[] for _ in set_indices]
+        for r_i, s_i in enumerate(self.set_of):
+            self.set_heaps[s_i].append((self.rotation_priority(r_i), 0, r_i))
+        for set_heap in self.set_heaps:
+            heapq.heapify(set_heap)
+        self.set_stamps = [0] * len(set_indices)
+        self.heap = []
+        for s_i in range(len(set_indices)):
+            self.push_set(s_i)
+
+    def __len__(self) -> int:
+        return len(self.set_of)
+
+    # smallest first, the order within a set
+    def rotation_priority(self, r_i: int) -> Tuple[float, float, int]:
+        return -self.gains[r_i] / (self.tries[r_i] + 1), -self.improvements[r_i] / (self.tries[r_i] + 1), r_i
+
+    # smallest first
+    def priority(self, r_i: int) -> Tuple[float, float, int, int]:
+        s_i = self.set_of[r_i]
+        expected_gain = (self.gains[r_i] / (self.tries[r_i] + 1) +
+                         self.set_gains[s_i] / (self.set_tries[s_i] + 1))
+        hit_rate = (self.improvements[r_i] / (self.tries[r_i] + 1) +
+                    self.set_improvements[s_i] / (self.set_tries[s_i] + 1))
+        return -expected_gain, -hit_rate, self.set_sizes[s_i], r_i
+
+    def push_rotation(self, r_i: int):
+        self.stamps[r_i] += 1
+        heapq.heappush(self.set_heaps[self.set_of[r_i]], (self.rotation_priority(r_i), self.stamps[r_i], r_i))
+
+    # the set's best unverified rotation goes on the heap across sets, replacing any earlier entry for the set
+    def push_set(self, s_i: int):
+        set_heap = self.set_heaps[s_i]
+        while set_heap and (set_heap[0][1] != self.stamps[set_heap[0][2]] or
+                            self.verified_lap[set_heap[0][2]] == self.lap):
+            heapq.heappop(set_heap)
+        self.set_stamps[s_i] += 1
+        if set_heap:
+            r_i = set_heap[0][2]
+            heapq.heappush(self.heap, (self.priority(r_i), self.set_stamps[s_i], s_i, r_i))
+
+    def next_rotation(self) -> int:
+        while self.heap and self.heap[0][1] != self.set_stamps[self.heap[0][2]]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return -1
+        return self.heap[0][3]
+
+    # rotation indices until a full lap without improvement, record() each one before asking for the next
+    def __iter__(self) -> Iterator[int]:
+        r_i = self.next_rotation()
+        while r_i >= 0:
+            yield r_i
+            r_i = self.next_rotation()
+
+    # gain: score change over trying the rotation, including the swaps after each accepted rotation
+    def record(self, r_i: int, improved: bool, gain: float):
+        s_i = self.set_of[r_i]
+        self.tries[r_i] += 1
+        self.set_tries[s_i] += 1
+        changed_sets = {s_i}
+        if not improved:
+            self.verified_lap[r_i] = self.lap
+            self.verified_this_lap.append(r_i)
+        else:
+            self.improvements[r_i] += 1
+            self.set_improvements[s_i] += 1
+            self.gains[r_i] += gain
+            self.set_gains[s_i] += gain
+            self.lap += 1
+            for verified_i in self.verified_this_lap:
+                self.push_rotation(verified_i)
+                changed_sets.add(self.set_of[verified_i])
+            self.verified_this_lap = []
+            self.push_rotation(r_i)
+        for changed_s_i in changed_sets:
+            self.push_set(changed_s_i)
@@ -0,0 +1,42 @@
+import contextlib
+import json
+import time
+from collections import defaultdict
+
+
+# Phase timings and hot path counters for one AuctionState run.
+# Hot paths check enabled before touching anything else, so a disabled RunStats costs one attribute lookup
+class RunStats:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.phase_seconds = {}
+        self.counts = defaultdict(int)
+        # per rotation, summed over every lap of improve_allocation_rotate
+        self.rotation_seconds = defaultdict(float)
+        self.rotation_calls = defaultdict(int)
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0) + time.perf_counter() - start
+
+    def add_rotation(self, rotation: tuple, seconds: float):
+        self.rotation_seconds[rotation] += seconds
+        self.rotation_calls[rotation] += 1
+
+    def as_dict(self) -> dict:
+        return {'phase_seconds': self.phase_seconds,
+                'total_seconds': sum(self.phase_seconds.values()),
+                'counts': dict(self.counts),
+                'rotations': [{'rotation': list(rotation), 'calls': self.rotation_calls[rotation], 'seconds': seconds}
+                              for rotation, seconds in self.rotation_seconds.items()]}
+
+    def write(self, filename: str):
+        with open(filename, 'w') as file:
+            json.dump(self.as_dict(), file, indent=1)
@@ -0,0 +1,43 @@
+import IncrementalScore
+import math
+import random
+from typing import List, Tuple
+
+
+# One simulated annealing chain over swaps and 3 unit loops, starting from owners shuffled by seed
+# (seed 0 keeps owners as given). Temperature falls geometrically from start to end over the iterations.
+# returns (best score, best owners) seen by the chain
+def anneal(scorer: IncrementalScore.IncrementalScore, owners: List[int], seed: int, iterations: int,
+           start_temperature: float, end_temperature: float, loop_share: float = 0.25) -> Tuple[float, List[int]]:
+    rng = random.Random(seed)
+    owners = list(owners)
+    if seed != 0:
+        rng.shuffle(owners)
+    scorer.set_owners(owners)
+
+    best_score = scorer.score
+    best_owners = list(scorer.owners)
+    num_players = scorer.num_players
+    cooling = (end_temperature / start_temperature) ** (1 / max(1, iterations))
+    temperature = start_temperature
+
+    for _ in range(iterations):
+        loop_size = 3 if num_players >= 3 and rng.random() < loop_share else 2
+        units = [rng.choice(scorer.teams[team]) for team in rng.sample(range(num_players), loop_size)]
+        changes = scorer.loop_changes(units)
+        gain = scorer.loop_gain(changes)
+
+        if gain > 0 or rng.random() < math.exp(gain / temperature):
+            scorer.apply_loop(changes)
+            if scorer.score > best_score + IncrementalScore.MIN_GAIN:
+                best_score = scorer.score
+                best_owners = list(scorer.owners)
+        temperature *= cooling
+
+    return best_score, best_owners
+
+
+# for pools started with IncrementalScore.init_worker
+def anneal_in_worker(owners: List[int], seed: int, iterations: int,
+                     start_temperature: float, end_temperature: float) -> Tuple[float, List[int]]:
+    return anneal(IncrementalScore.worker_scorer, owners, seed, iterations, start_temperature, end_temperature)
@@ -0,0 +1,91 @@
+import AuctionState
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+
+# Game directory of an auction directory, the parent as in directories.txt (FE8/auction2/ -> FE8/)
+def game_dir_of(auct_dir: str) -> str:
+    parent = os.path.dirname(os.path.normpath(auct_dir))
+    return f'{parent}/' if parent else ''
+
+
+# Runs one auction as AuctionState.run() would from directories.txt, writing auct_dir/output as usual.
+# With portraits (a dict, possibly empty) it also draws the visuals. Console output is discarded.
+# Errors are returned in the summary rather than raised, so one bad auction doesn't stop the batch
+def run_auction(game_dir: str, auct_dir: str, settings: Dict, portraits: Dict = None) -> Dict:
+    start = time.perf_counter()
+    summary = {'auct_dir': auct_dir, 'game_dir': game_dir}
+    try:
+        if portraits is None:
+            state = AuctionState.AuctionState()
+        else:
+            import AuctionStateVisuals
+            state = AuctionStateVisuals.AuctionStateVisuals()
+            state.portraits = dict(portraits)
+        state.game_dir = game_dir
+        state.auct_dir = auct_dir
+        for name, value in settings.items():
+            setattr(state, name, value)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            state.run()
+            if portraits is not None:
+                state.draw_all(evaluation=state.evaluation)
+
+        summary.update({'players': len(state.players), 'units': len(state.units), 'score': state.get_score(),
+                        'cut_short': state.cut_short, 'phase_seconds': state.stats.phase_seconds})
+    except Exception:
+        summary['error'] = traceback.format_exc()
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+# Runs every auction across a process pool, workers=0 for one per CPU.
+# Prints a summary table as auctions finish and writes all summaries, in the order given, to summary_file
+def run_batch(auct_dirs: List[str], settings: Dict = None, workers: int = 0, visuals: bool = False,
+              summary_file: str = 'batch_summary.json') -> List[Dict]:
+    settings = settings or {}
+    auct_dirs = [auct_dir if auct_dir.endswith('/') else f'{auct_dir}/' for auct_dir in auct_dirs]
+    game_dirs = {auct_dir: game_dir_of(auct_dir) for auct_dir in auct_dirs}
+    portraits = {}
+    if visuals:
+        import portrait_atlas
+        # once per game, then sent to each of its auctions
+        for game_dir in sorted(set(game_dirs.values())):
+            portraits[game_dir] = portrait_atlas.load(game_dir)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        futures = {pool.submit(run_auction, game_dirs[auct_dir], auct_dir, settings,
+                               portraits.get(game_dirs[auct_dir]) if visuals else None): i
+                   for i, auct_dir in enumerate(auct_dirs)}
+        summaries = [None] * len(auct_dirs)
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            if 'error' in summary:
+                print(f'{summary["auct_dir"]:30s} {summary["seconds"]:8.3f}s  FAILED')
+                print(summary['error'])
+            else:
+                print(f'{summary["auct_dir"]:30s} {summary["seconds"]:8.3f}s  '
+                      f'{summary["players"]:2d} players {summary["units"]:4d} units  '
+                      f'score {summary["score"]:8.3f}' + ('  cut short' if summary['cut_short'] else ''))
+
+    total_seconds = time.perf_counter() - start
+    print(f'{len(summaries)} auctions in {total_seconds:.3f}s, '
+          f'{sum(summary["seconds"] for summary in summaries):.3f}s of auction time')
+    with open(summary_file, 'w') as file:
+        json.dump({'total_seconds': total_seconds, 'settings': settings, 'auctions': summaries}, file, indent=1)
+    return summaries
+
+
+# python batch.py FE8/auction2/ FE8/auction3/ ...
+if __name__ == '__main__':
+    run_batch(sys.argv[1:])
@@ -0,0 +1,98 @@
+import AuctionState
+import contextlib
+import io
+import json
+import os
+import random
+import time
+from typing import Dict, List
+
+
+# Writes an auction in the format AuctionState.load reads.
+# bid_players: players with bids in bids.txt, the rest become dummy players at load (0 for all).
+# bid_distribution: 'uniform' over [0, max_bid], 'normal' around max_bid/2, or 'skewed' (exponential, few high bids).
+# synergy_density: fraction of unit pairs with a nonzero synergy in each synergy file,
+# written for the first synergy_players players (the rest get median synergies at load)
+def write_synthetic_auction(auct_dir: str, num_players: int, num_units: int, seed: int = 0,
+                            bid_players: int = 0, bid_distribution: str = 'uniform', max_bid: float = 10,
+                            synergy_players: int = 0, synergy_density: float = 0.01):
+    rng = random.Random(seed)
+    os.makedirs(auct_dir, exist_ok=True)
+    players = [f'Player{p}' for p in range(num_players)]
+    bid_players = bid_players or num_players
+
+    def bid() -> float:
+        if bid_distribution == 'normal':
+            return min(max_bid, max(0.0, rng.gauss(max_bid / 2, max_bid / 6)))
+        if bid_distribution == 'skewed':
+            return min(max_bid, rng.expovariate(4 / max_bid))
+        return rng.uniform(0, max_bid)
+
+    with open(f'{auct_dir}units.txt', 'w') as file:
+        file.write('\n'.join(f'Unit{u}' for u in range(num_units)) + '\n')
+    with open(f'{auct_dir}players.txt', 'w') as file:
+        file.write(' '.join(players) + '\n')
+    with open(f'{auct_dir}bids.txt', 'w') as file:
+        for _ in range(num_units):
+            file.write(' '.join(f'{bid():.2f}' for _ in range(bid_players)) + '\n')
+
+    num_pairs = int(synergy_density * num_units * (num_units - 1) / 2)
+    for player in players[:synergy_players]:
+        grid = [[0.0] * num_units for _ in range(num_units)]
+        for _ in range(num_pairs):
+            u_i, u_j = sorted(rng.sample(range(num_units), 2))
+            grid[u_i][u_j] = round(rng.uniform(-max_bid / 5, max_bid / 10), 2)
+        with open(f'{auct_dir}synergy_{player}.txt', 'w') as file:
+            file.write('\n'.join(' '.join(f'{s:g}' for s in row) for row in grid) + '\n')
+
+
+# Runs one auction with AuctionState's built-in RunStats, which time each phase and count hot path calls.
+# Console output is discarded, the numbered logs and stats.json are still written to auct_dir/output
+def time_phases(auct_dir: str, **settings) -> Dict:
+    state = AuctionState.AuctionState()
+    state.auct_dir = auct_dir
+    for name, value in settings.items():
+        setattr(state, name, value)
+    state.stats.enabled = True
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        state.run()
+
+    result = state.stats.as_dict()
+    result.update({'players': len(state.players), 'units': len(state.units), 'score': state.get_score()})
+    return result
+
+
+# Each case is the keyword arguments of write_synthetic_auction plus a name,
+# and optionally 'settings' of AuctionState attributes for the run
+CASES = [
+    {'name': 'p4_u40', 'num_players': 4, 'num_units': 40, 'synergy_players': 2, 'synergy_density': 0.02},
+    {'name': 'p5_u60', 'num_players': 5, 'num_units': 60, 'bid_players': 4, 'synergy_players': 3},
+    {'name': 'p6_u90_skewed', 'num_players': 6, 'num_units': 90, 'bid_distribution': 'skewed',
+     'synergy_players': 6, 'synergy_density': 0.005},
+    {'name': 'p8_u160', 'num_players': 8, 'num_units': 160, 'synergy_players': 4,
+     'settings': {'max_rotation_size': 4}},
+]
+
+
+# Appends one JSON line per case to results_file so runs can be compared over time
+def run_suite(cases: List[Dict], bench_dir: str = 'benchmark/', results_file: str = 'benchmark_results.jsonl'):
+    run_time = time.strftime('%Y-%m-%dT%H:%M:%S')
+    for case in cases:
+        case = dict(case)
+        name = case.pop('name')
+        settings = case.pop('settings', {})
+        auct_dir = f'{bench_dir}{name}/'
+        write_synthetic_auction(auct_dir, **case)
+
+        result = time_phases(auct_dir, **settings)
+        result.update({'case': name, 'time': run_time, 'config': case, 'settings': settings})
+        print(f'{name:16s} {result["total_seconds"]:8.3f}s  ' +
+              '  '.join(f'{phase} {seconds:.3f}s' for phase, seconds in result['phase_seconds'].items()) +
+              f'  get_score calls {result["counts"].get("get_score", 0)}')
+        with open(results_file, 'a') as file:
+            file.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    run_suite(CASES)
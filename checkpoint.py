@@ -0,0 +1,37 @@
+import os
+import pickle
+import input_cache
+from typing import Dict, List, Optional
+
+# bump whenever AuctionState saves or resumes checkpoints differently
+CHECKPOINT_VERSION = 1
+CHECKPOINT_FILENAME = 'checkpoint.pickle'
+
+
+# saved contents if the checkpoint exists and every input file is unchanged since it was saved, else None
+def read(output_dir: str, sources: List[str]) -> Optional[Dict]:
+    try:
+        with open(f'{output_dir}{CHECKPOINT_FILENAME}', 'rb') as file:
+            saved = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if saved.get('version') != CHECKPOINT_VERSION:
+        return None
+    if input_cache.stamps(sources) != saved['sources']:
+        return None
+    return saved
+
+
+# replaces any earlier checkpoint, a crash while writing leaves the earlier one intact
+def write(output_dir: str, sources: List[str], contents: Dict):
+    saved = dict(contents)
+    saved['version'] = CHECKPOINT_VERSION
+    saved['sources'] = input_cache.stamps(sources)
+    input_cache.write_pickle(f'{output_dir}{CHECKPOINT_FILENAME}', saved)
+
+
+def remove(output_dir: str):
+    try:
+        os.remove(f'{output_dir}{CHECKPOINT_FILENAME}')
+    except FileNotFoundError:
+        pass
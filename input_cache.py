@@ -0,0 +1,59 @@
+import os
+import pickle
+from typing import Dict, List, Optional, Tuple
+
+# bump whenever AuctionState.load parses or normalizes inputs differently
+CACHE_VERSION = 3
+CACHE_FILENAME = 'input_cache.pickle'
+
+
+# (path, size, mtime) of each source file, or (path, -1, -1) if missing so that creating it invalidates the cache
+def stamps(paths: List[str]) -> List[Tuple[str, int, int]]:
+    stamp_list = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stamp_list.append((path, -1, -1))
+        else:
+            stamp_list.append((path, stat.st_size, stat.st_mtime_ns))
+    return stamp_list
+
+
+# cached contents if the cache exists and every source file it was built from is unchanged, else None
+def read(auct_dir: str) -> Optional[Dict]:
+    try:
+        with open(f'{auct_dir}{CACHE_FILENAME}', 'rb') as file:
+            cache = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if cache.get('version') != CACHE_VERSION:
+        return None
+    if stamps([path for path, _, _ in cache['sources']]) != cache['sources']:
+        return None
+    return cache
+
+
+def write(auct_dir: str, sources: List[str], contents: Dict):
+    cache = dict(contents)
+    cache['version'] = CACHE_VERSION
+    cache['sources'] = stamps(sources)
+    write_pickle(f'{auct_dir}{CACHE_FILENAME}', cache)
+
+
+# Pickles through a temporary file replacing filename, so a crash while writing leaves any earlier file intact.
+# Also used for checkpoints and portrait atlases. They are all optional, so a failed write (e.g. a read-only
+# directory) only returns False
+def write_pickle(filename: str, contents) -> bool:
+    temp_filename = f'{filename}.tmp'
+    try:
+        with open(temp_filename, 'wb') as file:
+            pickle.dump(contents, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, filename)
+    except OSError:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        return False
+    return True
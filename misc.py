@@ -1,6 +1,5 @@
-import itertools
 import traceback
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Tuple
 
 
 def extend_array(array, length: int, filler) -> None:
@@ -8,11 +7,11 @@ def extend_array(array, length: int, filler) -> None:
         array.append(filler)
 
 
-# reads a file as a grid of values of a specific type
-def read_grid(filename: str, grid_type: type = str) -> List[List]:
+# reads a file as a grid of values of a specific type, announcing it through echo, e.g. an AuctionLog's
+def read_grid(filename: str, grid_type: type = str, echo: Callable[[str], None] = print) -> List[List]:
     file = open(filename, 'r')
 
-    print(f'reading {filename}')
+    echo(f'reading {filename}')
     grid = []
     for line in file:
         next_row = []
@@ -61,5 +60,63 @@ def just_one_loop(permutation: Tuple) -> bool:
     return True
 
 
-def one_loop_permutations(max_loop_size: int) -> List[Tuple]:
-    return [p for p in itertools.permutations(range(max_loop_size)) if just_one_loop(p)]
+def one_loop_permutations(num_players: int, max_loop_size: int = 0) -> List[Tuple]:
+    return list(single_loop_permutations(num_players, max_loop_size))
+
+
+# Lazily yields the permutations just_one_loop accepts, in the same (lexicographic) order,
+# optionally only loops of at most max_loop_size players (0 for no limit).
+# Builds the permutation index by index, only descending while the prefix can still be
+# completed into a single loop, so no filtered-out permutation is generated.
+def single_loop_permutations(num_players: int, max_loop_size: int = 0) -> Iterator[Tuple]:
+    if max_loop_size <= 0:
+        max_loop_size = num_players
+    permutation = [-1] * num_players
+    used = [False] * num_players
+
+    # can permutation[:length] be completed to one loop of 3 to max_loop_size players, all others fixed?
+    def completable(length: int) -> bool:
+        loop_members = 0
+        chains = 0
+        in_chain = [False] * length
+        for start in range(length):
+            if permutation[start] == start or used[start]:
+                continue  # fixed, or not the head of a chain
+            chains += 1
+            member = start
+            while member < length:
+                in_chain[member] = True
+                loop_members += 1
+                member = permutation[member]
+            loop_members += 1  # chain ends at an index not yet assigned
+
+        # trading indices outside chains form closed loops, then remaining indices must be fixed
+        closed_loops = 0
+        for start in range(length):
+            if permutation[start] != start and not in_chain[start]:
+                closed_loops += 1
+                member = start
+                while not in_chain[member]:
+                    in_chain[member] = True
+                    loop_members += 1
+                    member = permutation[member]
+        if closed_loops > 0:
+            return closed_loops == 1 and chains == 0 and 3 <= loop_members <= max_loop_size
+
+        free = num_players - length - chains
+        return max(loop_members, 3) <= max_loop_size and loop_members + free >= 3
+
+    def recursive(index: int):
+        if index >= num_players:
+            yield tuple(permutation)
+            return
+        for item in range(num_players):
+            if not used[item]:
+                permutation[index] = item
+                used[item] = True
+                if completable(index + 1):
+                    yield from recursive(index + 1)
+                used[item] = False
+        permutation[index] = -1
+
+    yield from recursive(0)
@@ -0,0 +1,49 @@
+import os
+import pickle
+import input_cache
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from typing import Dict
+
+# bump whenever portraits are decoded or stored differently
+ATLAS_VERSION = 1
+ATLAS_FILENAME = 'portrait_atlas.pickle'
+
+
+def portrait_files(game_dir: str) -> Dict[str, str]:
+    portrait_dir = f'{game_dir}portraits/'
+    if not os.path.isdir(portrait_dir):
+        return {}
+    return {filename[:-len('.png')]: f'{portrait_dir}{filename}'
+            for filename in sorted(os.listdir(portrait_dir)) if filename.endswith('.png')}
+
+
+# as RGB, which is what pasting onto the RGB canvases converts to anyway, so every portrait stores as raw pixels
+def decode(filename: str) -> Image.Image:
+    with Image.open(filename) as image:
+        return image.convert('RGB')
+
+
+# Every portrait of a game by unit name, decoded.
+# The decoded pixels are kept in game_dir/portrait_atlas.pickle, which is rebuilt when any portrait file
+# is added, removed or changed. Rebuilding decodes on a thread pool, PIL releases the GIL while decoding
+def load(game_dir: str, workers: int = 8) -> Dict[str, Image.Image]:
+    files = portrait_files(game_dir)
+    sources = input_cache.stamps(list(files.values()))
+    try:
+        with open(f'{game_dir}{ATLAS_FILENAME}', 'rb') as file:
+            atlas = pickle.load(file)
+        if atlas.get('version') == ATLAS_VERSION and atlas['sources'] == sources:
+            return {name: Image.frombytes(mode, size, pixels)
+                    for name, (mode, size, pixels) in atlas['portraits'].items()}
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    with ThreadPoolExecutor(workers) as pool:
+        portraits = dict(zip(files, pool.map(decode, files.values())))
+
+    atlas = {'version': ATLAS_VERSION, 'sources': sources,
+             'portraits': {name: (image.mode, image.size, image.tobytes()) for name, image in portraits.items()}}
+    # a read-only game directory is still usable without the atlas
+    input_cache.write_pickle(f'{game_dir}{ATLAS_FILENAME}', atlas)
+    return portraits
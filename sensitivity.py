@@ -0,0 +1,114 @@
+import AuctionLog
+import AuctionState
+import random
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+
+# Inputs of a loaded auction with every bid and synergy scaled by its own triangular(1-noise, 1+noise) draw,
+# the same kind of noise load() gives dummy players. bid_sums move with the bids of the units still in the auction
+def perturbed_inputs(inputs: Dict, seed: int, noise: float) -> Dict:
+    rng = random.Random(seed)
+    bids = [[bid * rng.triangular(1 - noise, 1 + noise) for bid in row] for row in inputs['bids']]
+    bid_sums = list(inputs['bid_sums'])
+    for row, old_row in zip(bids, inputs['bids']):
+        for i, (bid, old_bid) in enumerate(zip(row, old_row)):
+            bid_sums[i] += bid - old_bid
+    synergies = [{pair: synergy * rng.triangular(1 - noise, 1 + noise) for pair, synergy in sorted(player.items())}
+                 for player in inputs['synergies']]
+    return dict(inputs, bids=bids, bid_sums=bid_sums, synergies=synergies)
+
+
+# Process pool workers for run_sensitivity.
+# The base inputs, allocation and settings are sent once per worker, each task only sends a seed
+worker_base = None
+
+
+def init_worker(inputs: Dict, owners: List[int], settings: Dict):
+    global worker_base
+    worker_base = (inputs, owners, settings)
+
+
+# Re-optimizes one perturbed auction, warm started from the base allocation, swapping and rotating
+# to a fixed point as run() does. Returns (score, owners, handicaps)
+def run_sample(seed: int, noise: float) -> Tuple[float, List[int], List[float]]:
+    inputs, owners, settings = worker_base
+    state = AuctionState.AuctionState()
+    state.log = AuctionLog.AuctionLog(AuctionLog.QUIET, files=False)
+    state.stats.enabled = False
+    state.checkpoint_interval = 0
+    for name, value in settings.items():
+        setattr(state, name, value)
+    state.set_inputs(perturbed_inputs(inputs, seed, noise))
+    for unit, owner in zip(state.units, owners):
+        unit.owner = owner
+    state.build_array_engine()
+
+    state.swap_phase()
+    state.rotation_phase()
+    return state.get_score(), state.owners(), state.handicaps()
+
+
+# Samples seeds seed+1 .. seed+samples around an auction that has already run.
+# Returns per unit the fraction of samples each player ended up owning it,
+# and per player the handicap of every sample
+def run_sensitivity(state: AuctionState.AuctionState, samples: int = 100, noise: float = 0.2, seed: int = 0,
+                    workers: int = 1) -> Dict:
+    settings = {'robust_factor': state.robust_factor, 'max_rotation_size': state.max_rotation_size,
+                'best_improvement_swaps': state.best_improvement_swaps}
+    initargs = (state.inputs(), state.owners(), settings)
+    seeds = [seed + s + 1 for s in range(samples)]
+    noises = [noise] * samples
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as pool:
+            results = list(pool.map(run_sample, seeds, noises))
+    else:
+        init_worker(*initargs)
+        results = [run_sample(s, noise) for s, noise in zip(seeds, noises)]
+
+    ownership = [[0] * len(state.players) for _ in state.units]
+    for _, owners, _ in results:
+        for u, owner in enumerate(owners):
+            ownership[u][owner] += 1
+    return {'scores': [score for score, _, _ in results],
+            'ownership': [[count / samples for count in row] for row in ownership],
+            'handicaps': [[handicaps[p] for _, _, handicaps in results] for p in range(len(state.players))],
+            'base_owners': state.owners(), 'base_handicaps': state.handicaps()}
+
+
+def format_sensitivity(state: AuctionState.AuctionState, results: Dict, noise: float):
+    samples = len(results['scores'])
+    state.print_and_log(f'---Bid sensitivity, {samples} samples of +-{noise:.0%} bid and synergy noise---')
+    state.print_and_log(f'Score: base {state.get_score():7.3f}, samples mean {statistics.mean(results["scores"]):7.3f} '
+                        f'min {min(results["scores"]):7.3f} max {max(results["scores"]):7.3f}')
+    state.print_and_log('')
+
+    state.print_and_log('Ownership frequency, * marks the base owner')
+    state.print_and_log(' ' * 13 + ' '.join([f'{player[:8]:8s}' for player in state.players]))
+    for unit, row, base_owner in zip(state.units, results['ownership'], results['base_owners']):
+        state.print_and_log(f'{(unit.name[:12]):12s} ' +
+                            ' '.join([f'{share:6.0%}{"*" if p == base_owner else " "} '
+                                      for p, share in enumerate(row)]))
+    state.print_and_log('')
+
+    state.print_and_log('Handicaps     base    mean   stdev     min     5%     95%     max')
+    for player, base, handicaps in zip(state.players, results['base_handicaps'], results['handicaps']):
+        twentieths = statistics.quantiles(handicaps, n=20) if samples > 1 else handicaps * 19
+        stdev = statistics.stdev(handicaps) if samples > 1 else 0
+        state.print_and_log(f'{player[:10]:10s} {base:7.2f} {statistics.mean(handicaps):7.2f} {stdev:7.2f} '
+                            f'{min(handicaps):7.2f} {twentieths[0]:7.2f} {twentieths[-1]:7.2f} {max(handicaps):7.2f}')
+
+
+# python sensitivity.py [samples] [workers] [noise]
+# Runs the auction from directories.txt with the RNG seeded, then writes the sensitivity report as the next output file
+if __name__ == '__main__':
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    noise = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    random.seed(0)
+    base = AuctionState.AuctionState()
+    base.run()
+    format_sensitivity(base, run_sensitivity(base, samples, noise, 0, workers), noise)
+    base.write_logs('sensitivity')
@@ -0,0 +1,206 @@
+import AuctionLog
+import AuctionState
+import filecmp
+import input_cache
+import os
+import re
+import shutil
+import sys
+import time
+from typing import Dict, List
+
+OUTPUT_FILE_PATTERN = re.compile(r'(\d\d)_(.+)\.txt')
+# written by Evaluation.export
+EXPORT_FILENAMES = ('evaluation.json', 'matrices.csv', 'teams.csv')
+
+
+# Keeps an auction in memory after a full run() and follows edits to its input files.
+# Edits to bids.txt or synergy files re-parse only what changed, then swap and rotate from the previous allocation.
+# Only output files whose contents change are rewritten, keeping their numbers.
+# Edits to units.txt or players.txt, or edits that change which units are removed, run() from scratch
+class AuctionWatcher:
+    def __init__(self, settings: Dict = None, level: int = AuctionLog.VERBOSE, poll_interval: float = 1.0):
+        self.settings = settings or {}
+        self.level = level
+        self.poll_interval = poll_interval
+        self.game_dir = ''
+        self.auct_dir = ''
+        # the optimized auction, after removing units
+        self.state = None
+        # inputs as loaded, before removing units. Edits are parsed into it
+        self.source = None
+        self.sources = []
+        self.output_numbers = {}
+
+    def new_state(self, level: int = None, files: bool = True) -> AuctionState.AuctionState:
+        state = AuctionState.AuctionState()
+        state.game_dir = self.game_dir
+        state.auct_dir = self.auct_dir
+        state.log = AuctionLog.AuctionLog(self.level if level is None else level, files=files)
+        state.log.directory = f'{self.auct_dir}output/'
+        for name, value in self.settings.items():
+            setattr(state, name, value)
+        return state
+
+    def output_dir(self) -> str:
+        return f'{self.auct_dir}output/'
+
+    def start(self):
+        self.state = self.new_state()
+        self.state.run()
+        self.game_dir = self.state.game_dir
+        self.auct_dir = self.state.auct_dir
+
+        # the inputs run() loaded, so the dummy players' bids match even without the input cache
+        self.source = self.new_state(AuctionLog.QUIET, files=False)
+        self.source.set_inputs(self.state.loaded_inputs)
+        self.source.declared_synergies = self.state.loaded_inputs['declared_synergies']
+        self.sources = input_cache.stamps(self.source.input_files())
+
+        self.output_numbers = {}
+        for filename in sorted(os.listdir(self.output_dir())):
+            match = OUTPUT_FILE_PATTERN.fullmatch(filename)
+            if match:
+                self.output_numbers[match.group(2)] = int(match.group(1))
+
+    # input files that differ from the last parse, once they've stopped changing for a poll interval
+    def changed_files(self) -> List[str]:
+        stamps = input_cache.stamps(self.source.input_files())
+        if stamps == self.sources:
+            return []
+        time.sleep(self.poll_interval)
+        settled = input_cache.stamps(self.source.input_files())
+        if settled != stamps:
+            return []
+        changed = [new[0] for new, old in zip(settled, self.sources) if new != old]
+        self.sources = settled
+        return changed
+
+    def update(self, changed: List[str]):
+        names = {path[len(self.auct_dir):] for path in changed}
+        if names & {'units.txt', 'players.txt'}:
+            print(f'{", ".join(sorted(names))} changed, rerunning')
+            self.start()
+            return
+
+        start = time.perf_counter()
+        if 'bids.txt' in names:
+            self.source.parse_bids(self.source.roster.bid_rows())
+        changed_players = [p for p, player in enumerate(self.source.players) if f'synergy_{player}.txt' in names]
+        if changed_players:
+            # later players without a file get new medians too
+            old_synergies = self.source.synergies
+            self.source.parse_synergies(changed_players)
+            changed_players = [p for p, (old, new) in enumerate(zip(old_synergies, self.source.synergies))
+                               if p in changed_players or old != new]
+        if self.source.use_input_cache:
+            input_cache.write(self.auct_dir, self.source.input_files(),
+                              dict(self.source.inputs(), declared_synergies=self.source.declared_synergies))
+
+        staging_dir = f'{self.output_dir()}staging/'
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        rewritten = []
+
+        def stage(state: AuctionState.AuctionState, name: str):
+            state.log = AuctionLog.AuctionLog(self.level)
+            state.log.directory = staging_dir
+            state.log.logs_written = self.output_numbers[name]
+
+        def replace_if_changed(filename: str):
+            if os.path.exists(f'{self.output_dir()}{filename}') and \
+                    filecmp.cmp(f'{staging_dir}{filename}', f'{self.output_dir()}{filename}', shallow=False):
+                return
+            os.replace(f'{staging_dir}{filename}', f'{self.output_dir()}{filename}')
+            rewritten.append(filename)
+
+        def finish(state: AuctionState.AuctionState, name: str):
+            state.write_logs(name)
+            replace_if_changed(f'{self.output_numbers[name]:02d}_{name}.txt')
+
+        if 'bids.txt' in names:
+            stage(self.source, 'bids')
+            self.source.format_bids()
+            finish(self.source, 'bids')
+        for p in changed_players:
+            name = f'synergy_{self.source.players[p]}'
+            stage(self.source, name)
+            self.source.format_synergy(p)
+            finish(self.source, name)
+
+        trimmed = self.new_state()
+        stage(trimmed, 'remove_units')
+        trimmed.set_inputs(self.source.inputs())
+        while len(trimmed.units) % len(trimmed.players) != 0:
+            trimmed.remove_least_valued_unit()
+        if [unit.name for unit in trimmed.units] != [unit.name for unit in self.state.units]:
+            trimmed.log.write('remove_units')
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            print('Removed units changed, rerunning')
+            self.start()
+            return
+        finish(trimmed, 'remove_units')
+
+        state = self.state
+        owners = state.owners()
+        state.set_inputs(trimmed.inputs())
+        for unit, owner in zip(state.units, owners):
+            unit.owner = owner
+        state.build_array_engine()
+        state.deadline = time.perf_counter() + state.time_budget if state.time_budget > 0 else 0
+        state.cut_short = False
+        state.checkpoint_phase = None
+
+        stage(state, 'reassignments')
+        state.print_and_log(f'---Reoptimizing from the previous allocation, score {state.get_score():7.3f}---')
+        if state.anneal_chains > 0:
+            state.improve_allocation_annealing()
+        else:
+            state.swap_phase()
+            state.rotation_phase()
+        if state.use_exact_solver:
+            state.improve_allocation_exact()
+        if state.cut_short:
+            state.print_and_log(state.cut_short_note())
+        finish(state, 'reassignments')
+
+        state.evaluation = state.evaluate()
+        stage(state, 'matrices')
+        if state.cut_short:
+            state.print_and_log(state.cut_short_note())
+        state.format_value_matrices(state.evaluation)
+        finish(state, 'matrices')
+        stage(state, 'teams')
+        if state.cut_short:
+            state.print_and_log(state.cut_short_note())
+        state.format_teams(state.evaluation)
+        finish(state, 'teams')
+        os.makedirs(staging_dir, exist_ok=True)
+        state.evaluation.export(staging_dir)
+        for filename in EXPORT_FILENAMES:
+            replace_if_changed(filename)
+
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        print(f'Updated in {time.perf_counter() - start:.3f}s, score {state.get_score():7.3f}, '
+              f'rewrote {", ".join(rewritten) if rewritten else "nothing"}')
+
+    # polls until interrupted, or for max_polls polls if given
+    def watch(self, max_polls: int = 0):
+        if self.state is None:
+            self.start()
+        print(f'Watching {self.auct_dir} for input changes')
+        polls = 0
+        try:
+            while max_polls == 0 or polls < max_polls:
+                polls += 1
+                time.sleep(self.poll_interval)
+                changed = self.changed_files()
+                if changed:
+                    self.update(changed)
+        except KeyboardInterrupt:
+            pass
+
+
+# python watch.py [poll interval seconds]
+# Runs the auction from directories.txt, then re-optimizes whenever its input files are edited
+if __name__ == '__main__':
+    AuctionWatcher(poll_interval=float(sys.argv[1]) if len(sys.argv) > 1 else 1.0).watch()